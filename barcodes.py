@@ -0,0 +1,167 @@
+"""
+Codes-barres EAN/UPC des boîtes de consommables et des étiquettes d'imprimantes.
+
+Les codes sont stockés sous forme normalisée (EAN-8 ou EAN-13, un UPC-A est
+complété par un 0) dans `consommables.code_barres` et `modeles.code_barres`,
+chacun avec un index unique : une lecture se résout par une recherche exacte.
+
+Utilisation :
+    python barcodes.py chercher CODE
+    python barcodes.py associer CODE --consommable REF
+    python barcodes.py associer CODE --modele NOM
+"""
+import argparse
+import sqlite3
+import sys
+
+from db import create_schema, get_db_connection, normalize_key
+from equivalences import SUBSTITUTES_SQL
+
+
+def normalize_barcode(text):
+    """
+    Retourne le code normalisé (EAN-8 ou EAN-13), ou None si `text` n'est pas un
+    code EAN-8, UPC-A, EAN-13 ou GTIN-14 valide (chiffre de contrôle compris).
+    """
+    code = (text or "").strip()
+    if not code.isdigit() or len(code) not in (8, 12, 13, 14):
+        return None
+
+    # Chiffre de contrôle GTIN : pondération 3,1,3,... en partant de la droite
+    digits = [int(d) for d in code[:-1]]
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    if (10 - total % 10) % 10 != int(code[-1]):
+        return None
+
+    if len(code) == 12:
+        return "0" + code
+    if len(code) == 14:
+        return code[1:] if code[0] == "0" else code
+    return code
+
+
+def lookup_barcode(conn, code):
+    """
+    Résout un code lu par recherche exacte indexée.
+    Retourne :
+      ("consommable", (type, reference, équivalents), [(marque, modèle), ...])
+      ("modele", (id_marque, marque, nom), [(type, reference, équivalents), ...])
+      ou None si le code est inconnu.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT c.id, c.type, c.reference, {SUBSTITUTES_SQL}
+        FROM consommables c
+        WHERE c.code_barres = ?
+    """, (code,))
+    consumable = cursor.fetchone()
+    if consumable:
+        cursor.execute("""
+            SELECT b.nom, m.nom
+            FROM modeles_consommables mc
+            JOIN modeles m ON m.id = mc.id_modele
+            JOIN marques b ON b.id = m.id_marque
+            WHERE mc.id_consommable = ?
+            ORDER BY b.nom, m.nom
+        """, (consumable[0],))
+        return "consommable", consumable[1:], cursor.fetchall()
+
+    cursor.execute("""
+        SELECT m.id, m.id_marque, b.nom, m.nom
+        FROM modeles m
+        JOIN marques b ON b.id = m.id_marque
+        WHERE m.code_barres = ?
+    """, (code,))
+    model = cursor.fetchone()
+    if model:
+        cursor.execute(f"""
+            SELECT c.type, c.reference, {SUBSTITUTES_SQL}
+            FROM modeles_consommables mc
+            JOIN consommables c ON c.id = mc.id_consommable
+            WHERE mc.id_modele = ?
+        """, (model[0],))
+        return "modele", model[1:], cursor.fetchall()
+
+    return None
+
+
+def check_barcode_free(cursor, code, table, row_id=None):
+    """
+    Lève ValueError si le code normalisé `code` est déjà porté par une autre ligne
+    (de `table` autre que `row_id`, ou de l'autre table). N'écrit rien.
+    """
+    other = "modeles" if table == "consommables" else "consommables"
+    cursor.execute(f"SELECT 1 FROM {other} WHERE code_barres = ?", (code,))
+    taken = cursor.fetchone()
+    if not taken:
+        cursor.execute(f"SELECT 1 FROM {table} WHERE code_barres = ? AND id IS NOT ?", (code, row_id))
+        taken = cursor.fetchone()
+    if taken:
+        raise ValueError(f"Le code {code} est déjà associé à un autre élément.")
+
+
+def set_barcode(conn, code, reference=None, model_name=None):
+    """
+    Associe un code à un consommable (par référence) ou à un modèle (par nom).
+    Lève ValueError si le code est invalide, la cible inconnue ou le code déjà utilisé.
+    """
+    normalized = normalize_barcode(code)
+    if normalized is None:
+        raise ValueError(f"Code-barres invalide : {code}")
+
+    if reference is not None:
+        table, column, key = "consommables", "reference_cle", normalize_key(reference)
+    else:
+        table, column, key = "modeles", "nom_cle", normalize_key(model_name)
+
+    cursor = conn.cursor()
+    # Un même code ne peut désigner à la fois un consommable et une imprimante
+    cursor.execute(f"SELECT id FROM {table} WHERE {column} = ?", (key,))
+    targets = cursor.fetchall()
+    if len(targets) != 1:
+        raise ValueError(f"Élément introuvable ou ambigu : {reference or model_name}")
+    check_barcode_free(cursor, normalized, table, targets[0][0])
+
+    try:
+        cursor.execute(f"UPDATE {table} SET code_barres = ? WHERE id = ?", (normalized, targets[0][0]))
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        raise ValueError(f"Le code {normalized} est déjà associé à un autre élément.")
+    conn.commit()
+    return normalized
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Codes-barres des consommables et des imprimantes")
+    parser.add_argument("action", choices=["chercher", "associer"])
+    parser.add_argument("code")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--consommable", help="Référence du consommable à associer")
+    target.add_argument("--modele", help="Nom du modèle à associer")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    create_schema(conn)
+    try:
+        if args.action == "associer":
+            if not args.consommable and not args.modele:
+                parser.error("associer attend --consommable ou --modele")
+            print(set_barcode(conn, args.code, args.consommable, args.modele))
+        else:
+            code = normalize_barcode(args.code)
+            found = lookup_barcode(conn, code) if code else None
+            if found is None:
+                sys.exit(f"Code inconnu : {args.code}")
+            kind, item, related = found
+            if kind == "consommable":
+                print(f"{item[1]} ({item[0]})" + (f" - équivalents : {item[2]}" if item[2] else ""))
+                for brand, model in related:
+                    print(f"  {brand} {model}")
+            else:
+                print(f"{item[1]} {item[2]}")
+                for ctype, reference, substitutes in related:
+                    print(f"  {reference} ({ctype})" + (f" - équivalents : {substitutes}" if substitutes else ""))
+    except ValueError as e:
+        sys.exit(str(e))
+    finally:
+        conn.close()
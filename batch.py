@@ -0,0 +1,153 @@
+"""
+Recherche par lot : résout une liste de modèles (parc d'un client) en une seule
+jointure et produit la liste dédoublonnée des consommables à commander.
+
+Utilisation :
+    python batch.py liste.txt [--marque HP] [--csv commande.csv]
+    (un modèle par ligne, "-" pour lire l'entrée standard)
+"""
+import argparse
+import csv
+import os
+import sys
+
+from db import create_schema, get_db_connection, get_db_path, normalize_key
+
+
+def resolve_models(conn, names, brand_name=None):
+    """
+    Résout tous les modèles de `names` avec des requêtes ensemblistes.
+    Retourne un dictionnaire :
+      - "consommables" : [(reference, type, quantite)] quantite = imprimantes concernées
+      - "inconnus" : modèles saisis introuvables dans le catalogue
+      - "ambigus" : modèles saisis qui correspondent à plusieurs modèles (même clé dans
+        plusieurs marques), avec les candidats ; exclus de la commande
+      - "modeles" : nombre de lignes saisies reconnues sans ambiguïté
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS lot_modeles (
+            position INTEGER PRIMARY KEY,
+            saisie TEXT NOT NULL,
+            cle TEXT NOT NULL
+        )
+    """)
+    cursor.execute("DELETE FROM lot_modeles")
+    cursor.executemany(
+        "INSERT INTO lot_modeles (saisie, cle) VALUES (?, ?)",
+        [(name.strip(), normalize_key(name)) for name in names if normalize_key(name)],
+    )
+
+    # Modèles reconnus, limités à une marque si demandé, calculés une seule fois
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS lot_resolus (
+            position INTEGER NOT NULL,
+            id_modele INTEGER NOT NULL,
+            PRIMARY KEY (position, id_modele)
+        )
+    """)
+    cursor.execute("DELETE FROM lot_resolus")
+    cursor.execute("""
+        INSERT INTO lot_resolus (position, id_modele)
+        SELECT l.position, m.id
+        FROM lot_modeles l
+        CROSS JOIN modeles m ON m.nom_cle = l.cle  -- CROSS JOIN : parcourir le lot, pas le catalogue
+        JOIN marques b ON b.id = m.id_marque
+        WHERE ? IS NULL OR b.nom = ?
+    """, (brand_name, brand_name))
+
+    cursor.execute("""
+        SELECT l.saisie FROM lot_modeles l
+        WHERE NOT EXISTS (SELECT 1 FROM lot_resolus r WHERE r.position = l.position)
+        ORDER BY l.position
+    """)
+    unknown = [row[0] for row in cursor.fetchall()]
+
+    # Une ligne = une imprimante : sans marque pour départager, ne rien commander
+    cursor.execute("""
+        SELECT l.saisie, GROUP_CONCAT(b.nom || ' ' || m.nom, ', ')
+        FROM lot_resolus r
+        JOIN lot_modeles l ON l.position = r.position
+        JOIN modeles m ON m.id = r.id_modele
+        JOIN marques b ON b.id = m.id_marque
+        GROUP BY r.position
+        HAVING COUNT(*) > 1
+        ORDER BY r.position
+    """)
+    ambiguous = [f"{name} ({candidates})" for name, candidates in cursor.fetchall()]
+    cursor.execute("""
+        DELETE FROM lot_resolus WHERE position IN (
+            SELECT position FROM lot_resolus GROUP BY position HAVING COUNT(*) > 1
+        )
+    """)
+
+    cursor.execute("""
+        SELECT c.reference, c.type, COUNT(DISTINCT r.position) AS quantite
+        FROM lot_resolus r
+        JOIN modeles_consommables mc ON mc.id_modele = r.id_modele
+        JOIN consommables c ON c.id = mc.id_consommable
+        GROUP BY c.id
+        ORDER BY quantite DESC, c.reference
+    """)
+    consumables = cursor.fetchall()
+
+    cursor.execute("SELECT COUNT(*) FROM lot_modeles")
+    total = cursor.fetchone()[0]
+
+    cursor.execute("DELETE FROM lot_modeles")
+    cursor.execute("DELETE FROM lot_resolus")
+    return {
+        "consommables": consumables,
+        "inconnus": unknown,
+        "ambigus": ambiguous,
+        "modeles": total - len(unknown) - len(ambiguous),
+    }
+
+
+def export_csv(result, path):
+    """Écrit la commande (et les modèles inconnus ou ambigus) dans un fichier CSV séparé par ';'."""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["reference", "type", "quantite"])
+        writer.writerows(result["consommables"])
+        for title in ("inconnus", "ambigus"):
+            if result[title]:
+                writer.writerow([])
+                writer.writerow([f"modeles_{title}"])
+                writer.writerows([name] for name in result[title])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Consommables nécessaires pour une liste de modèles")
+    parser.add_argument("liste", help="Fichier avec un modèle par ligne ('-' pour l'entrée standard)")
+    parser.add_argument("--marque", default=None, help="Limiter la recherche à une marque")
+    parser.add_argument("--csv", default=None, help="Exporter le résultat dans ce fichier CSV")
+    args = parser.parse_args()
+
+    if args.liste == "-":
+        names = sys.stdin.read().splitlines()
+    else:
+        if not os.path.isfile(args.liste):
+            sys.exit(f"Fichier introuvable : {args.liste}")
+        with open(args.liste, encoding="utf-8") as f:
+            names = f.read().splitlines()
+
+    if not os.path.isfile(get_db_path()):
+        sys.exit(f"Base introuvable : {get_db_path()}")
+    conn = get_db_connection()
+    create_schema(conn)
+    result = resolve_models(conn, names, args.marque.upper() if args.marque else None)
+    conn.close()
+
+    if args.csv:
+        export_csv(result, args.csv)
+
+    print(f"Modèles reconnus : {result['modeles']}")
+    for reference, ctype, quantity in result["consommables"]:
+        print(f"  {quantity:>5} x {reference} ({ctype})")
+    for title, label in (("inconnus", "Modèles inconnus"),
+                         ("ambigus", "Modèles présents dans plusieurs marques (préciser --marque)")):
+        if result[title]:
+            print(f"{label} : {len(result[title])}")
+            for name in result[title]:
+                print(f"  {name}")
@@ -0,0 +1,286 @@
+"""
+Banc d'essai de réactivité de PrinterApp, sans affichage (plateforme Qt "offscreen").
+
+Simule une saisie clavier réaliste et des lectures de codes-barres (rafale de
+chiffres puis Entrée) dans `model_input` sur des catalogues synthétiques de
+plusieurs tailles, et mesure :
+  - la latence touche -> dernière modification de `suggestions_list` (signaux du
+    modèle de la liste, y compris quand la mise à jour est différée par scan_timer),
+  - la latence clic sur une suggestion ou Entrée -> changement de `result_label`,
+  - les blocages de la boucle d'événements (battement de cœur en retard),
+  - le nombre de lignes ajoutées/retirées dans `suggestions_list` par mise à jour.
+
+Utilisation :
+    python bench_ui.py [--tailles 1000 10000 100000] [--modeles 50] [--graine 1]
+"""
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtTest import QTest
+from PyQt5.QtWidgets import QApplication
+
+from db import create_schema, normalize_key
+import main
+
+HEARTBEAT_MS = 5     # Période du battement de cœur de la boucle d'événements
+STALL_MS = 50        # Retard au-delà duquel on compte un blocage
+PREFIXES = ["LASERJET P", "MFP M", "PIXMA MG", "WORKFORCE WF-", "HL-L", "ECOSYS M", "SX", "DCP-T"]
+TYPES = ["TONER", "CARTOUCHE", "RESERVOIR"]
+
+
+def ean13(number):
+    """Code EAN-13 valide (chiffre de contrôle compris) à partir d'un entier."""
+    digits = f"200{number:09d}"  # Préfixe 200-299 : usage interne
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def build_catalog(path, n_models, n_brands=20, seed=1):
+    """
+    Crée un catalogue synthétique de `n_models` modèles, chacun avec un code-barres.
+    Retourne [(id_marque, nom, code-barres)].
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    cursor = conn.cursor()
+
+    cursor.executemany("INSERT INTO marques (nom) VALUES (?)", [(f"MARQUE {i}",) for i in range(n_brands)])
+    brand_ids = [row[0] for row in cursor.execute("SELECT id FROM marques")]
+
+    n_consumables = max(n_models // 10, 1)
+    references = [f"R{i:06d}" for i in range(n_consumables)]
+    cursor.executemany(
+        "INSERT INTO consommables (reference, type, reference_cle) VALUES (?, ?, ?)",
+        [(ref, rng.choice(TYPES), normalize_key(ref)) for ref in references],
+    )
+
+    models = []
+    for i in range(n_models):
+        name = f"{rng.choice(PREFIXES)}{i}"
+        models.append((name, rng.choice(brand_ids), normalize_key(name), ean13(i)))
+    cursor.executemany("INSERT INTO modeles (nom, id_marque, nom_cle, code_barres) VALUES (?, ?, ?, ?)", models)
+
+    cursor.execute("""
+        INSERT INTO modeles_consommables (id_modele, id_consommable)
+        SELECT id, 1 + ABS(RANDOM()) % ? FROM modeles
+    """, (n_consumables,))
+    conn.commit()
+    conn.close()
+    return [(brand_id, name, code) for name, brand_id, _, code in models]
+
+
+def percentiles(values):
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {"n": len(ordered), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1]}
+
+
+class Session:
+    """
+    Rejoue une suite d'actions planifiées dans la boucle d'événements Qt
+    (chaque action est lancée par QTimer après son délai) et collecte les mesures.
+    Les latences sont mesurées sur les effets visibles (signaux du modèle de
+    `suggestions_list`, texte de `result_label`), pas sur la durée de l'appel :
+    une mise à jour différée par un minuteur est donc comptée jusqu'au bout.
+    """
+
+    def __init__(self, app, window, actions):
+        self.app = app
+        self.window = window
+        self.actions = iter(actions)
+        self.key_latencies = []
+        self.result_latencies = []
+        self.churn = []
+        self.stalls = []
+
+        self.key_start = None      # Dernière touche pas encore suivie d'une mesure
+        self.last_change = None    # Dernière modification de la liste depuis cette touche
+        self.rows_changed = 0
+        self.result_start = None   # Clic ou Entrée en attente d'un nouveau résultat
+
+        model = window.suggestions_list.model()
+        model.rowsInserted.connect(self.count_rows)
+        model.rowsRemoved.connect(self.count_rows)
+        model.modelReset.connect(self.list_changed)
+
+        self.last_beat = None
+        self.heartbeat = QTimer()
+        self.heartbeat.setInterval(HEARTBEAT_MS)
+        self.heartbeat.timeout.connect(self.beat)
+
+    def count_rows(self, parent, first, last):
+        self.rows_changed += last - first + 1
+        self.list_changed()
+
+    def list_changed(self):
+        self.last_change = time.perf_counter()
+
+    def beat(self):
+        now = time.perf_counter()
+        if self.last_beat is not None:
+            late = (now - self.last_beat) * 1000 - HEARTBEAT_MS
+            if late > STALL_MS:
+                self.stalls.append(late)
+        self.last_beat = now
+        self.check_result()
+
+    def finish_key(self):
+        """Clôt la mesure de la dernière touche si la liste a changé depuis."""
+        if self.key_start is not None and self.last_change is not None:
+            self.key_latencies.append((self.last_change - self.key_start) * 1000)
+            self.churn.append(self.rows_changed)
+        self.key_start = None
+        self.last_change = None
+        self.rows_changed = 0
+
+    def check_result(self):
+        """Clôt la mesure du résultat dès que `result_label` a changé."""
+        if self.result_start is not None and self.window.result_label.text():
+            self.result_latencies.append((time.perf_counter() - self.result_start) * 1000)
+            self.result_start = None
+
+    def run(self):
+        self.heartbeat.start()
+        self.schedule_next()
+        self.app.exec_()
+        self.heartbeat.stop()
+        self.finish_key()
+
+        model = self.window.suggestions_list.model()
+        model.rowsInserted.disconnect(self.count_rows)
+        model.rowsRemoved.disconnect(self.count_rows)
+        model.modelReset.disconnect(self.list_changed)
+
+    def schedule_next(self):
+        action = next(self.actions, None)
+        if action is None:
+            # Laisser aux minuteurs en cours (scan_timer) le temps de finir
+            QTimer.singleShot(200, self.app.quit)
+            return
+        delay_ms, callback = action
+
+        def fire():
+            self.finish_key()
+            callback(self)
+            self.schedule_next()
+
+        QTimer.singleShot(int(delay_ms), fire)
+
+    # Actions
+    def key(self, char):
+        self.key_start = time.perf_counter()
+        QTest.keyClicks(self.window.model_input, char)
+
+    def start_result(self):
+        self.window.result_label.clear()  # Un résultat identique au précédent doit aussi compter
+        self.result_start = time.perf_counter()
+
+    def pick_suggestion(self):
+        item = self.window.suggestions_list.item(0)
+        if item is None:
+            return
+        self.start_result()
+        self.window.suggestions_list.itemClicked.emit(item)
+        self.check_result()
+
+    def press_return(self):
+        self.start_result()
+        QTest.keyClick(self.window.model_input, Qt.Key_Return)
+        self.check_result()
+
+    def clear(self):
+        self.window.model_input.clear()
+
+
+def typing_actions(rng, name):
+    """Frappe humaine : 2 caractères ou plus, ~110 ms entre touches, puis clic sur une suggestion."""
+    typed = name[:rng.randint(2, len(name))]
+    actions = [(max(30, rng.gauss(110, 35)), lambda s, ch=ch: s.key(ch)) for ch in typed]
+    actions.append((rng.uniform(300, 800), lambda s: s.pick_suggestion()))
+    actions.append((rng.uniform(500, 1000), lambda s: s.clear()))
+    return actions
+
+
+def scanner_actions(rng, code):
+    """Lecture de code-barres : tous les chiffres à 2-8 ms d'intervalle, puis Entrée."""
+    actions = [(rng.uniform(2, 8), lambda s, ch=ch: s.key(ch)) for ch in code]
+    actions.append((rng.uniform(2, 8), lambda s: s.press_return()))
+    actions.append((300, lambda s: s.clear()))
+    return actions
+
+
+def run_size(app, n_models, n_lookups, seed):
+    """Mesure une session sur un catalogue de `n_models` modèles."""
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        models = build_catalog(os.path.join(tmp, "printers.db"), n_models, seed=seed)
+        previous_dir = os.getcwd()
+        os.chdir(tmp)  # get_db_connection() ouvre printers.db dans le répertoire courant
+        try:
+            window = main.PrinterApp()
+            window.idle_timer.stop()
+            window.show()
+
+            reports = {}
+            for mode in ("frappe", "lecteur"):
+                actions = []
+                for brand_id, name, code in rng.sample(models, min(n_lookups, len(models))):
+                    brand_index = window.brand_dropdown.findData(brand_id)
+                    actions.append((0, lambda s, i=brand_index: s.window.brand_dropdown.setCurrentIndex(i)))
+                    if mode == "frappe":
+                        actions.extend(typing_actions(rng, name))
+                    else:
+                        actions.extend(scanner_actions(rng, code))
+
+                session = Session(app, window, actions)
+                session.run()
+                reports[mode] = {
+                    "suggestions_ms": percentiles(session.key_latencies),
+                    "resultat_ms": percentiles(session.result_latencies),
+                    "blocages_ms": percentiles(session.stalls),
+                    "lignes_par_maj": percentiles(session.churn),
+                }
+
+            window.close()
+        finally:
+            os.chdir(previous_dir)
+    return reports
+
+
+def format_stats(stats):
+    if not stats["n"]:
+        return "n=0"
+    return (f"n={stats['n']:<5} p50={stats['p50']:7.2f} p95={stats['p95']:7.2f} "
+            f"p99={stats['p99']:7.2f} max={stats['max']:7.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Réactivité de PrinterApp sans affichage")
+    parser.add_argument("--tailles", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Nombre de modèles des catalogues synthétiques")
+    parser.add_argument("--modeles", type=int, default=50, help="Modèles recherchés par session")
+    parser.add_argument("--graine", type=int, default=1)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    for size in args.tailles:
+        reports = run_size(app, size, args.modeles, args.graine)
+        print(f"\nCatalogue de {size} modèles")
+        for mode, report in reports.items():
+            print(f"  {mode}")
+            for metric, stats in report.items():
+                print(f"    {metric:<18} {format_stats(stats)}")
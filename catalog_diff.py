@@ -0,0 +1,192 @@
+"""
+Différences entre deux fichiers printers.db (avant de remplacer le sien par
+celui d'un collègue).
+
+Les deux bases sont attachées à une même connexion et comparées par requêtes
+ensemblistes sur les clés naturelles (nom de marque, nom de modèle, référence),
+les identifiants pouvant différer d'un fichier à l'autre.
+
+Utilisation :
+    python catalog_diff.py ancien.db nouveau.db [--patch diff.json] [--max 20]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+# Modèles exprimés par clés naturelles, pour un schéma donné
+_MODELS = """
+    SELECT m.nom AS nom, b.nom AS marque
+    FROM {db}.modeles m JOIN {db}.marques b ON b.id = m.id_marque
+"""
+# Champs d'un consommable comparés (ceux présents dans les deux bases)
+CONSUMABLE_FIELDS = ("type", "code_barres", "prix", "rendement", "origine")
+# Liens d'une base absents de l'autre : les identifiants sont traduits par les
+# tables de correspondance, puis chaque lien est cherché dans la clé primaire de l'autre base
+_LINKS = """
+    SELECT m.nom, c.reference
+    FROM {src}.modeles_consommables l
+    JOIN {src}.modeles m ON m.id = l.id_modele
+    JOIN {src}.consommables c ON c.id = l.id_consommable
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM correspondance_modeles cm, correspondance_consommables cc, {dst}.modeles_consommables o
+        WHERE cm.{src} = l.id_modele AND cc.{src} = l.id_consommable
+          AND o.id_modele = cm.{dst} AND o.id_consommable = cc.{dst}
+    )
+    ORDER BY 1, 2
+"""
+
+
+def _rows(conn, sql):
+    return [list(row) for row in conn.execute(sql)]
+
+
+def _added_removed(conn, select):
+    """Lignes présentes seulement dans la nouvelle base, puis seulement dans l'ancienne."""
+    old, new = select.format(db="ancien"), select.format(db="nouveau")
+    return (
+        _rows(conn, f"{new} EXCEPT {old} ORDER BY 1, 2"),
+        _rows(conn, f"{old} EXCEPT {new} ORDER BY 1, 2"),
+    )
+
+
+def _columns(conn, schema, table):
+    return {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+
+
+def _modified_consumables(conn):
+    """
+    Consommables présents dans les deux bases dont un champ comparé diffère.
+    Retourne [[reference, {champ: ancienne valeur}, {champ: nouvelle valeur}]],
+    seuls les champs modifiés figurant dans les dictionnaires.
+    """
+    common = _columns(conn, "ancien", "consommables") & _columns(conn, "nouveau", "consommables")
+    fields = [field for field in CONSUMABLE_FIELDS if field in common]
+    values = ", ".join(f"a.{field}, n.{field}" for field in fields)
+    changed = " OR ".join(f"a.{field} IS NOT n.{field}" for field in fields)
+    modified = []
+    for reference, *pairs in conn.execute(f"""
+        SELECT n.reference, {values}
+        FROM nouveau.consommables n JOIN ancien.consommables a ON a.reference = n.reference
+        WHERE {changed} ORDER BY n.reference
+    """):
+        before, after = {}, {}
+        for field, old, new in zip(fields, pairs[::2], pairs[1::2]):
+            if old != new:
+                before[field], after[field] = old, new
+        modified.append([reference, before, after])
+    return modified
+
+
+def diff_catalogs(old_path, new_path):
+    """
+    Compare deux catalogues et retourne le correctif :
+    {table: {"ajoutes": [...], "supprimes": [...], "modifies": [...]}}
+    """
+    conn = sqlite3.connect(":memory:", uri=True)
+    conn.execute("ATTACH ? AS ancien", (f"file:{old_path}?mode=ro",))
+    conn.execute("ATTACH ? AS nouveau", (f"file:{new_path}?mode=ro",))
+
+    patch = {}
+
+    added, removed = _added_removed(conn, "SELECT nom, NULL FROM {db}.marques")
+    patch["marques"] = {
+        "ajoutes": [row[0] for row in added],
+        "supprimes": [row[0] for row in removed],
+    }
+
+    # Un modèle qui change de marque n'est ni ajouté ni supprimé : il est modifié
+    old, new = _MODELS.format(db="ancien"), _MODELS.format(db="nouveau")
+    patch["modeles"] = {
+        "ajoutes": _rows(conn, f"""
+            SELECT n.nom, n.marque FROM ({new}) n
+            WHERE n.nom NOT IN (SELECT nom FROM ancien.modeles) ORDER BY n.nom
+        """),
+        "supprimes": _rows(conn, f"""
+            SELECT a.nom, a.marque FROM ({old}) a
+            WHERE a.nom NOT IN (SELECT nom FROM nouveau.modeles) ORDER BY a.nom
+        """),
+        "modifies": _rows(conn, f"""
+            SELECT n.nom, a.marque, n.marque
+            FROM ({new}) n JOIN ({old}) a ON a.nom = n.nom
+            WHERE a.marque <> n.marque ORDER BY n.nom
+        """),
+    }
+
+    patch["consommables"] = {
+        "ajoutes": _rows(conn, """
+            SELECT reference, type FROM nouveau.consommables
+            WHERE reference NOT IN (SELECT reference FROM ancien.consommables) ORDER BY reference
+        """),
+        "supprimes": _rows(conn, """
+            SELECT reference, type FROM ancien.consommables
+            WHERE reference NOT IN (SELECT reference FROM nouveau.consommables) ORDER BY reference
+        """),
+        "modifies": _modified_consumables(conn),
+    }
+
+    # Correspondance des identifiants entre les deux bases (par nom et par référence)
+    conn.executescript("""
+        CREATE TEMP TABLE correspondance_modeles (ancien INTEGER PRIMARY KEY, nouveau INTEGER NOT NULL UNIQUE);
+        CREATE TEMP TABLE correspondance_consommables (ancien INTEGER PRIMARY KEY, nouveau INTEGER NOT NULL UNIQUE);
+        INSERT INTO correspondance_modeles
+            SELECT a.id, n.id FROM ancien.modeles a JOIN nouveau.modeles n ON n.nom = a.nom;
+        INSERT INTO correspondance_consommables
+            SELECT a.id, n.id FROM ancien.consommables a JOIN nouveau.consommables n ON n.reference = a.reference;
+    """)
+    patch["liens"] = {
+        "ajoutes": _rows(conn, _LINKS.format(src="nouveau", dst="ancien")),
+        "supprimes": _rows(conn, _LINKS.format(src="ancien", dst="nouveau")),
+    }
+
+    conn.close()
+    return patch
+
+
+def _format_fields(value):
+    if isinstance(value, dict):
+        return ", ".join(f"{field}={field_value}" for field, field_value in value.items())
+    return value
+
+
+def print_report(patch, limit=20):
+    labels = {"ajoutes": "+", "supprimes": "-", "modifies": "~"}
+    total = 0
+    for table, changes in patch.items():
+        counts = ", ".join(f"{len(rows)} {kind}" for kind, rows in changes.items())
+        print(f"{table} : {counts}")
+        for kind, rows in changes.items():
+            total += len(rows)
+            for row in rows[:limit]:
+                if kind == "modifies":
+                    text = f"{row[0]} : {_format_fields(row[1])} -> {_format_fields(row[2])}"
+                else:
+                    text = " ".join(row) if isinstance(row, list) else row
+                print(f"  {labels[kind]} {text}")
+            if len(rows) > limit:
+                print(f"  ... et {len(rows) - limit} autre(s)")
+    if not total:
+        print("Aucune différence.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Différences entre deux catalogues d'imprimantes")
+    parser.add_argument("ancien", help="Base actuelle")
+    parser.add_argument("nouveau", help="Base reçue")
+    parser.add_argument("--patch", default=None, help="Écrire les différences au format JSON")
+    parser.add_argument("--max", type=int, default=20, help="Lignes affichées par catégorie")
+    args = parser.parse_args()
+
+    for path in (args.ancien, args.nouveau):
+        if not os.path.isfile(path):
+            sys.exit(f"Fichier introuvable : {path}")
+    try:
+        patch = diff_catalogs(args.ancien, args.nouveau)
+    except sqlite3.DatabaseError as e:
+        sys.exit(f"Lecture impossible : {e}")
+    if args.patch:
+        with open(args.patch, "w", encoding="utf-8") as f:
+            json.dump(patch, f, ensure_ascii=False, indent=2)
+    print_report(patch, args.max)
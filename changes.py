@@ -0,0 +1,39 @@
+"""
+Détection des modifications du catalogue, y compris celles faites depuis un autre poste.
+
+`PRAGMA data_version` change dès qu'une autre connexion a validé une écriture :
+le lire ne coûte presque rien, on peut donc l'interroger à intervalle régulier.
+Quand il change, la table `versions_catalogue` (tenue à jour par des triggers,
+voir db.create_schema) indique quelles tables ont été modifiées.
+"""
+import sqlite3
+
+
+class ChangeDetector:
+    """Garde une connexion ouverte et signale les tables modifiées depuis le dernier appel."""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.data_version = self._read_data_version()
+        self.versions = self._read_versions()
+
+    def _read_data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _read_versions(self):
+        return dict(self.conn.execute("SELECT nom_table, version FROM versions_catalogue"))
+
+    def poll(self):
+        """Retourne l'ensemble des tables modifiées (vide si rien n'a changé)."""
+        data_version = self._read_data_version()
+        if data_version == self.data_version:
+            return set()
+        self.data_version = data_version
+
+        versions = self._read_versions()
+        changed = {table for table, version in versions.items() if self.versions.get(table) != version}
+        self.versions = versions
+        return changed
+
+    def close(self):
+        self.conn.close()
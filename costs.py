@@ -0,0 +1,319 @@
+"""
+Coût à la page et consommation d'un parc d'imprimantes.
+
+Chaque consommable peut porter un rendement (pages), un prix unitaire et une
+origine (CONSTRUCTEUR ou COMPATIBLE). Un modèle consomme un exemplaire de chaque
+groupe d'équivalence qui lui est lié (noir, cyan, ...) : son coût à la page est
+la somme, sur ces groupes, du prix à la page du consommable retenu dans chacun.
+
+Le catalogue est chargé une fois dans des tableaux NumPy ; le calcul d'un parc
+entier se fait ensuite par opérations vectorisées, sans boucle par modèle.
+
+Utilisation :
+    python costs.py parc.csv [--mois 12] [--csv commande.csv]
+    (une imprimante par ligne : "modele;pages par mois" ou "marque;modele;pages par mois",
+    "-" pour l'entrée standard)
+"""
+import argparse
+import csv
+import math
+import sys
+
+import numpy as np
+
+from db import create_schema, get_db_connection, normalize_key
+
+MONTHS = 12  # Durée de projection par défaut
+STRATEGIES = ("constructeur", "meilleur")  # Consommables d'origine seulement, ou le moins cher du groupe
+
+
+def _cheapest(groups, n_groups, cost):
+    """
+    Consommable le moins cher de chaque groupe selon `cost` (NaN = non tarifé).
+    Retourne (indice du consommable par groupe, -1 si aucun ; coût par groupe, NaN si aucun).
+    """
+    choice = np.full(n_groups, -1)
+    best = np.full(n_groups, np.nan)
+    priced = np.flatnonzero(~np.isnan(cost))
+    if priced.size:
+        order = priced[np.lexsort((cost[priced], groups[priced]))]
+        first = np.ones(order.size, dtype=bool)
+        first[1:] = groups[order[1:]] != groups[order[:-1]]
+        winners = order[first]
+        choice[groups[winners]] = winners
+        best[groups[winners]] = cost[winners]
+    return choice, best
+
+
+class CostCatalog:
+    """
+    Catalogue chargé en tableaux : consommables indexés par position, groupes
+    d'équivalence liés à chaque modèle stockés par modèle (format CSR : les
+    groupes du modèle i sont pair_groups[pair_starts[i]:pair_starts[i] + pair_counts[i]]).
+    """
+
+    def load(self, conn):
+        """Charge consommables, modèles et liens en trois requêtes."""
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT c.id, c.reference, c.type, c.origine, c.rendement, c.prix,
+                   COALESCE(g.id_groupe, c.id)
+            FROM consommables c
+            LEFT JOIN groupes_equivalence g ON g.id_consommable = c.id
+            ORDER BY c.id
+        """)
+        ids, references, types, origins, yields, prices, group_ids = list(zip(*cursor.fetchall())) or [()] * 7
+        self.consumable_ids = np.array(ids, dtype=np.int64)
+        self.references = np.array(references, dtype=object)
+        self.types = np.array(types, dtype=object)
+        self.origins = np.array(origins, dtype=object)
+        self.yields = np.array(yields, dtype=float)  # None -> NaN
+        self.prices = np.array(prices, dtype=float)
+        self.cost_per_page = self.prices / self.yields
+
+        unique_groups, groups = np.unique(np.array(group_ids, dtype=np.int64), return_inverse=True)
+        n_groups = unique_groups.size
+        oem_cost = np.where(self.origins == "CONSTRUCTEUR", self.cost_per_page, np.nan)
+        self.choices = {
+            "constructeur": _cheapest(groups, n_groups, oem_cost),
+            "meilleur": _cheapest(groups, n_groups, self.cost_per_page),
+        }
+
+        cursor.execute("""
+            SELECT m.id, COALESCE(b.nom, ''), m.nom_cle
+            FROM modeles m LEFT JOIN marques b ON b.id = m.id_marque
+            ORDER BY m.id
+        """)
+        model_ids, brand_names, model_keys = list(zip(*cursor.fetchall())) or [(), (), ()]
+        model_ids = np.array(model_ids, dtype=np.int64)
+        # Deux index triés : par clé seule, et par marque + clé (une même clé peut exister dans deux marques)
+        keys = np.array(model_keys, dtype=str)
+        brand_keys = np.array([f"{brand}\t{key}" for brand, key in zip(brand_names, model_keys)], dtype=str)
+        self.key_order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.key_order]
+        self.brand_key_order = np.argsort(brand_keys, kind="stable")
+        self.sorted_brand_keys = brand_keys[self.brand_key_order]
+
+        cursor.execute("SELECT id_modele, id_consommable FROM modeles_consommables")
+        links = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+        models = self._positions(model_ids, links[:, 0])
+        consumables = self._positions(self.consumable_ids, links[:, 1])
+        valid = (models >= 0) & (consumables >= 0)
+
+        # Un modèle lié à l'original et à son compatible n'en consomme qu'un des deux : paires (modèle, groupe) uniques
+        pairs = np.unique(models[valid] * n_groups + groups[consumables[valid]])
+        pair_models = pairs // max(n_groups, 1)
+        self.pair_groups = pairs % max(n_groups, 1)
+        self.pair_counts = np.bincount(pair_models, minlength=model_ids.size)
+        self.pair_starts = np.cumsum(self.pair_counts) - self.pair_counts
+
+        # Coût à la page de chaque modèle, NaN si un de ses groupes n'est pas tarifé
+        self.model_cost_per_page = {}
+        for strategy, (choice, group_cost) in self.choices.items():
+            cost = np.bincount(pair_models, weights=group_cost[self.pair_groups], minlength=model_ids.size).astype(float)
+            cost[self.pair_counts == 0] = np.nan
+            self.model_cost_per_page[strategy] = cost
+        return self
+
+    @staticmethod
+    def _positions(sorted_ids, values):
+        """Position de chaque valeur dans `sorted_ids`, -1 si absente."""
+        positions = np.searchsorted(sorted_ids, values)
+        positions = np.minimum(positions, max(sorted_ids.size - 1, 0))
+        found = sorted_ids.size > 0 and (sorted_ids[positions] == values)
+        return np.where(found, positions, -1)
+
+    @staticmethod
+    def _lookup(sorted_keys, order, queries):
+        """Indice de modèle par clé cherchée : -1 si inconnue, -2 si plusieurs modèles la portent."""
+        first = np.searchsorted(sorted_keys, queries, side="left")
+        last = np.searchsorted(sorted_keys, queries, side="right")
+        found = order[np.minimum(first, max(sorted_keys.size - 1, 0))] if sorted_keys.size else first
+        return np.where(last - first == 1, found, np.where(last - first > 1, -2, -1))
+
+    def find_models(self, names, brands=None):
+        """
+        Indice de modèle pour chaque nom (comparé par clé normalisée, dans la marque
+        indiquée si `brands` la donne), -1 si inconnu, -2 si ambigu entre marques.
+        """
+        keys = [normalize_key(name) for name in names]
+        brands = [(brand or "").strip().upper() for brand in brands] if brands else [""] * len(keys)
+        with_brand = np.array([bool(brand) for brand in brands], dtype=bool)
+        models = self._lookup(self.sorted_keys, self.key_order, np.array(keys, dtype=str))
+        if with_brand.any():
+            queries = np.array([f"{brand}\t{key}" for brand, key in zip(brands, keys)], dtype=str)
+            by_brand = self._lookup(self.sorted_brand_keys, self.brand_key_order, queries)
+            models = np.where(with_brand, by_brand, models)
+        return models
+
+    def _project(self, models, pages, months, choice):
+        """
+        Cartouches à commander sur `months` mois, par consommable : pour chaque
+        imprimante et chaque groupe de son modèle, ceil(pages * mois / rendement).
+        """
+        counts = self.pair_counts[models]
+        printers = np.repeat(np.arange(models.size), counts)
+        rank = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        chosen = choice[self.pair_groups[np.repeat(self.pair_starts[models], counts) + rank]]
+        priced = chosen >= 0
+        quantities = np.ceil(pages[printers[priced]] * months / self.yields[chosen[priced]])
+        return np.bincount(chosen[priced], weights=quantities, minlength=self.consumable_ids.size)
+
+    def _order(self, models, pages, months, strategy):
+        """Quantités par consommable et montant total de la commande pour une stratégie."""
+        quantities = self._project(models, pages, months, self.choices[strategy][0])
+        return quantities, float(np.nansum(quantities * self.prices))
+
+    def fleet(self, names, monthly_pages, months=MONTHS, brands=None):
+        """
+        Coûts d'un parc : une imprimante par élément de `names` / `monthly_pages`
+        (et de `brands`, facultatif).
+        Une imprimante n'entre dans la commande d'une stratégie que si tous ses
+        consommables y sont tarifés : une commande ne couvre jamais une partie d'imprimante.
+        Retourne un dictionnaire :
+          - "cout_page" : {stratégie: tableau du coût à la page par imprimante (NaN si inconnu)}
+          - "commandes" : {stratégie: [(reference, type, origine, quantite, cout)]}
+          - "totaux" : {stratégie: coût des commandes sur la période}
+          - "tarifees" / "sans_tarif" : {stratégie: imprimantes reconnues avec / sans tarif complet}
+          - "economie" : écart constructeur - meilleur sur les imprimantes tarifées dans les
+            deux stratégies ("comparees"), None si aucune
+          - "inconnus", "ambigus" : modèles saisis introuvables, ou présents dans plusieurs marques
+        """
+        models = self.find_models(names, brands)
+        pages = np.asarray(monthly_pages, dtype=float)
+        known = models >= 0
+
+        result = {"cout_page": {}, "commandes": {}, "totaux": {}, "tarifees": {}, "sans_tarif": {}}
+        priced = {}
+        for strategy in STRATEGIES:
+            cost = np.full(models.size, np.nan)
+            cost[known] = self.model_cost_per_page[strategy][models[known]]
+            result["cout_page"][strategy] = cost
+            priced[strategy] = known & ~np.isnan(cost)
+            result["tarifees"][strategy] = int(np.count_nonzero(priced[strategy]))
+            result["sans_tarif"][strategy] = int(np.count_nonzero(known & ~priced[strategy]))
+
+            selected = priced[strategy]
+            quantities, total = self._order(models[selected], pages[selected], months, strategy)
+            ordered = np.flatnonzero(quantities)
+            amounts = quantities[ordered] * self.prices[ordered]
+            ranking = ordered[np.argsort(-amounts, kind="stable")]
+            result["commandes"][strategy] = [
+                (self.references[i], self.types[i], self.origins[i], int(quantities[i]),
+                 float(quantities[i] * self.prices[i]))
+                for i in ranking
+            ]
+            result["totaux"][strategy] = total
+
+        # Comparer les stratégies sur les mêmes imprimantes seulement
+        common = priced["constructeur"] & priced["meilleur"]
+        result["comparees"] = int(np.count_nonzero(common))
+        result["economie"] = None
+        if result["comparees"]:
+            result["economie"] = (
+                self._order(models[common], pages[common], months, "constructeur")[1]
+                - self._order(models[common], pages[common], months, "meilleur")[1]
+            )
+
+        result["inconnus"] = [name for name, model in zip(names, models) if model == -1]
+        result["ambigus"] = [name for name, model in zip(names, models) if model == -2]
+        return result
+
+
+def _number(text):
+    """Nombre saisi à la française : virgule décimale, espaces entre les milliers."""
+    return text.replace(",", ".").replace(" ", "").replace("\u00a0", "").replace("\u202f", "")
+
+
+def read_fleet(lines):
+    """
+    Lit les lignes "modele;pages par mois" ou "marque;modele;pages par mois".
+    Les lignes vides et l'en-tête (première ligne non vide, si son volume n'est
+    pas un nombre) sont ignorés ; toute autre ligne sans modèle ou sans volume
+    valide (nombre positif ou nul) est rejetée.
+    Retourne (noms, pages, marques, rejets) ; rejets = ["ligne N : texte"].
+    """
+    names, pages, brands, rejected = [], [], [], []
+    first = True
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        row = [cell.strip() for cell in next(csv.reader([line], delimiter=";"))]
+        is_first, first = first, False
+        try:
+            volume = float(_number(row[-1])) if len(row) >= 2 else None
+        except ValueError:
+            if is_first:
+                continue  # En-tête
+            volume = None
+        if volume is None or not math.isfinite(volume) or volume < 0 or not row[-2]:
+            rejected.append(f"ligne {number} : {line.strip()}")
+            continue
+        pages.append(volume)
+        names.append(row[-2])
+        brands.append(row[-3] if len(row) >= 3 else "")
+    return names, pages, brands, rejected
+
+
+def export_csv(result, path, strategy="meilleur"):
+    """Écrit la commande projetée dans un fichier CSV séparé par ';' (même format que batch.py)."""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["reference", "type", "origine", "quantite", "cout"])
+        writer.writerows(
+            (reference, ctype, origin or "", quantity, f"{amount:.2f}")
+            for reference, ctype, origin, quantity, amount in result["commandes"][strategy]
+        )
+        for title in ("inconnus", "ambigus"):
+            if result[title]:
+                writer.writerow([])
+                writer.writerow([f"modeles_{title}"])
+                writer.writerows([name] for name in result[title])
+        if result.get("rejets"):
+            writer.writerow([])
+            writer.writerow(["lignes_rejetees"])
+            writer.writerows([line] for line in result["rejets"])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Coût à la page et consommation d'un parc d'imprimantes")
+    parser.add_argument("parc", help="Fichier '[marque;]modele;pages par mois' ('-' pour l'entrée standard)")
+    parser.add_argument("--mois", type=int, default=MONTHS, help="Durée de projection en mois")
+    parser.add_argument("--csv", default=None, help="Exporter la commande la moins chère dans ce fichier CSV")
+    args = parser.parse_args()
+
+    if args.parc == "-":
+        names, pages, brands, rejected = read_fleet(sys.stdin.read().splitlines())
+    else:
+        with open(args.parc, encoding="utf-8") as f:
+            names, pages, brands, rejected = read_fleet(f.read().splitlines())
+
+    conn = get_db_connection()
+    create_schema(conn)
+    catalog = CostCatalog().load(conn)
+    conn.close()
+    result = catalog.fleet(names, pages, args.mois, brands)
+    result["rejets"] = rejected
+
+    if args.csv:
+        export_csv(result, args.csv)
+
+    print(f"Imprimantes : {len(names)} ({len(result['inconnus'])} inconnues, "
+          f"{len(result['ambigus'])} ambiguës entre marques, {len(rejected)} ligne(s) rejetée(s))")
+    for strategy in STRATEGIES:
+        print(f"\nCommande {strategy} sur {args.mois} mois : {result['totaux'][strategy]:.2f} "
+              f"({result['tarifees'][strategy]} imprimantes, {result['sans_tarif'][strategy]} sans tarif complet)")
+        for reference, ctype, origin, quantity, amount in result["commandes"][strategy][:20]:
+            print(f"  {quantity:>6} x {reference} ({ctype}, {origin or '?'}) {amount:>10.2f}")
+    if result["economie"] is None:
+        print("\nComparaison impossible : aucune imprimante n'est tarifée dans les deux stratégies.")
+    else:
+        print(f"\nÉcart constructeur - meilleur sur les {result['comparees']} imprimantes tarifées "
+              f"dans les deux stratégies : {result['economie']:.2f}")
+    for title, label in (("inconnus", "Modèles inconnus"),
+                         ("ambigus", "Modèles présents dans plusieurs marques (préciser marque;modele;pages)"),
+                         ("rejets", "Lignes rejetées (modèle ou volume mensuel manquant, illisible ou négatif)")):
+        if result[title]:
+            print(f"\n{label} : {len(result[title])}")
+            for name in result[title][:20]:
+                print(f"  {name}")
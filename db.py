@@ -1,19 +1,81 @@
+import sys
+import os
+import re
 import sqlite3
+import unicodedata
 
-def create_database():
-    conn = sqlite3.connect('printers.db')
+def get_db_path():
+    if getattr(sys, 'frozen', False):
+        # Chemin vers la base de données dans le dossier temporaire
+        db_path = os.path.join(sys._MEIPASS, 'printers.db')
+        # Vérifier si la base de données existe déjà dans le répertoire temporaire
+        if not os.path.exists(db_path):
+            import shutil  # Import local : inutile hors exécutable, et lent pour lookup.py
+            # Copier la base de données initiale depuis le dossier des ressources
+            initial_db_path = os.path.join(sys._MEIPASS, 'data', 'printers.db')
+            shutil.copy(initial_db_path, db_path)
+    else:
+        # Si non gelé, utilisez le chemin local
+        db_path = 'printers.db'
+    return db_path
+
+def get_db_connection():
+    conn = sqlite3.connect(get_db_path())
+    return conn
+
+# Tables dont les modifications sont signalées à l'interface
+TRACKED_TABLES = (
+    'marques', 'modeles', 'consommables', 'modeles_consommables',
+    'equivalences', 'groupes_equivalence',
+)
+
+def normalize_key(text):
+    """
+    Clé de recherche d'un nom de modèle ou d'une référence : majuscules, accents
+    retirés et seulement lettres/chiffres ("MFP M130", "MFP-M130" -> "MFPM130").
+    """
+    folded = unicodedata.normalize('NFKD', text or '')
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch))
+    return re.sub(r'[^0-9A-Z]', '', folded.upper())
+
+def _add_column(cursor, table, column, declaration):
+    """Ajoute une colonne si elle n'existe pas encore (mise à niveau d'une ancienne base)."""
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+def fill_missing_keys(cursor):
+    """
+    Calcule les clés manquantes (lignes ajoutées par une version précédente,
+    éventuellement depuis un autre poste). Retourne le nombre de lignes complétées.
+    """
+    cursor.execute("SELECT id, nom FROM modeles WHERE nom_cle IS NULL")
+    models = [(normalize_key(nom), model_id) for model_id, nom in cursor.fetchall()]
+    cursor.executemany("UPDATE modeles SET nom_cle = ? WHERE id = ?", models)
+    cursor.execute("SELECT id, reference FROM consommables WHERE reference_cle IS NULL")
+    consumables = [(normalize_key(reference), consumable_id) for consumable_id, reference in cursor.fetchall()]
+    cursor.executemany("UPDATE consommables SET reference_cle = ? WHERE id = ?", consumables)
+    return len(models) + len(consumables)
+
+
+def create_schema(conn):
+    """
+    Crée les tables manquantes sur une connexion ouverte.
+    Toutes les instructions sont idempotentes : on peut l'appeler à chaque démarrage
+    pour mettre à niveau une base existante.
+    """
     cursor = conn.cursor()
-    
+
     # Table des marques
-    cursor.execute(''' 
+    cursor.execute('''
         CREATE TABLE IF NOT EXISTS marques (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             nom TEXT UNIQUE NOT NULL
         )
     ''')
-    
+
     # Table des modèles
-    cursor.execute(''' 
+    cursor.execute('''
         CREATE TABLE IF NOT EXISTS modeles (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             nom TEXT UNIQUE NOT NULL,
@@ -23,7 +85,7 @@ def create_database():
     ''')
 
     # Table des consommables (cartouches, toners, réservoirs)
-    cursor.execute(''' 
+    cursor.execute('''
         CREATE TABLE IF NOT EXISTS consommables (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             reference TEXT UNIQUE NOT NULL,
@@ -32,7 +94,7 @@ def create_database():
     ''')
 
     # Table d'association entre modèles et consommables
-    cursor.execute(''' 
+    cursor.execute('''
         CREATE TABLE IF NOT EXISTS modeles_consommables (
             id_modele INTEGER,
             id_consommable INTEGER,
@@ -42,7 +104,117 @@ def create_database():
         )
     ''')
 
+    # Clés de recherche normalisées, remplies à l'écriture par normalize_key()
+    _add_column(cursor, 'modeles', 'nom_cle', 'TEXT')
+    _add_column(cursor, 'consommables', 'reference_cle', 'TEXT')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_modeles_marque_cle
+        ON modeles (id_marque, nom_cle)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_modeles_cle
+        ON modeles (nom_cle)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_consommables_cle
+        ON consommables (reference_cle)
+    ''')
+
+    fill_missing_keys(cursor)
+
+    # Codes-barres EAN/UPC normalisés (voir barcodes.py), uniques quand renseignés
+    _add_column(cursor, 'modeles', 'code_barres', 'TEXT')
+    _add_column(cursor, 'consommables', 'code_barres', 'TEXT')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_modeles_code_barres
+        ON modeles (code_barres) WHERE code_barres IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_consommables_code_barres
+        ON consommables (code_barres) WHERE code_barres IS NOT NULL
+    ''')
+
+    # Coût à la page (voir costs.py) : rendement en pages, prix unitaire et origine
+    _add_column(cursor, 'consommables', 'rendement', 'INTEGER CHECK (rendement > 0)')
+    _add_column(cursor, 'consommables', 'prix', 'REAL CHECK (prix >= 0)')
+    _add_column(cursor, 'consommables', 'origine', "TEXT CHECK (origine IN ('CONSTRUCTEUR', 'COMPATIBLE'))")
+
+    # Index inverse du lien : recherches par consommable (orphelins, modèles compatibles)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_modeles_consommables_consommable
+        ON modeles_consommables (id_consommable)
+    ''')
+
+    # Équivalences saisies entre consommables (origine <-> compatible), a < b
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS equivalences (
+            id_consommable_a INTEGER NOT NULL,
+            id_consommable_b INTEGER NOT NULL,
+            FOREIGN KEY (id_consommable_a) REFERENCES consommables (id) ON DELETE CASCADE,
+            FOREIGN KEY (id_consommable_b) REFERENCES consommables (id) ON DELETE CASCADE,
+            PRIMARY KEY (id_consommable_a, id_consommable_b),
+            CHECK (id_consommable_a < id_consommable_b)
+        )
+    ''')
+
+    # Groupes d'équivalence précalculés (fermeture transitive), voir equivalences.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS groupes_equivalence (
+            id_consommable INTEGER PRIMARY KEY,
+            id_groupe INTEGER NOT NULL,
+            FOREIGN KEY (id_consommable) REFERENCES consommables (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_groupes_equivalence_groupe
+        ON groupes_equivalence (id_groupe, id_consommable)
+    ''')
+
+    # Historique des recherches : une ligne par modèle consulté (compteur cumulé)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historique_recherches (
+            id_modele INTEGER PRIMARY KEY,
+            compteur INTEGER NOT NULL DEFAULT 0,
+            derniere_recherche INTEGER NOT NULL,
+            FOREIGN KEY (id_modele) REFERENCES modeles (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_historique_compteur
+        ON historique_recherches (compteur DESC)
+    ''')
+
+    # Catalogues de fournisseurs attachés pour la recherche fédérée (voir federation.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalogues_fournisseurs (
+            nom TEXT PRIMARY KEY,
+            chemin TEXT NOT NULL
+        )
+    ''')
+
+    # Compteur de modifications par table, lu par changes.ChangeDetector
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS versions_catalogue (
+            nom_table TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in TRACKED_TABLES:
+        cursor.execute("INSERT OR IGNORE INTO versions_catalogue (nom_table) VALUES (?)", (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS version_{table}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE versions_catalogue SET version = version + 1 WHERE nom_table = '{table}';
+                END
+            ''')
+
     conn.commit()
+
+def create_database(db_path='printers.db'):
+    conn = sqlite3.connect(db_path)
+    create_schema(conn)
     conn.close()
 
 if __name__ == '__main__':
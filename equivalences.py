@@ -0,0 +1,214 @@
+"""
+Équivalences entre consommables (origine ↔ compatibles).
+
+Les liens saisis sont stockés dans `equivalences` ; les groupes de consommables
+interchangeables (fermeture transitive) sont précalculés dans
+`groupes_equivalence`, mis à jour à chaque modification. Un consommable sans
+équivalent n'a pas de ligne dans `groupes_equivalence`.
+
+Utilisation :
+    python equivalences.py lier REF_A REF_B
+    python equivalences.py delier REF_A REF_B
+    python equivalences.py liste REF
+    python equivalences.py reconstruire
+"""
+import argparse
+import sys
+
+from db import create_schema, get_db_connection, normalize_key
+
+# Sous-requête corrélée : références équivalentes au consommable `c`, séparées par ", "
+_SUBSTITUTES_TEMPLATE = """(
+    SELECT GROUP_CONCAT(s.reference, ', ')
+    FROM {db}groupes_equivalence g
+    JOIN {db}groupes_equivalence gs ON gs.id_groupe = g.id_groupe AND gs.id_consommable <> g.id_consommable
+    JOIN {db}consommables s ON s.id = gs.id_consommable
+    WHERE g.id_consommable = c.id
+)"""
+SUBSTITUTES_SQL = _SUBSTITUTES_TEMPLATE.format(db="")
+
+
+def substitutes_sql(schema):
+    """SUBSTITUTES_SQL pour une base attachée sous le nom `schema`."""
+    return _SUBSTITUTES_TEMPLATE.format(db=f"{schema}.")
+
+
+def _find_consumable(cursor, reference):
+    cursor.execute("SELECT id, reference FROM consommables WHERE reference_cle = ?", (normalize_key(reference),))
+    rows = cursor.fetchall()
+    if not rows:
+        raise ValueError(f"Consommable inconnu : {reference}")
+    if len(rows) > 1:
+        # Doublons signalés par maintenance.py (references_en_double) : ne pas choisir au hasard
+        raise ValueError(
+            f"Plusieurs consommables correspondent à {reference} : {', '.join(r for _, r in rows)}"
+        )
+    return rows[0][0]
+
+
+def _group_of(cursor, consumable_id):
+    cursor.execute("SELECT id_groupe FROM groupes_equivalence WHERE id_consommable = ?", (consumable_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _components(edges):
+    """Union-find : retourne {id_consommable: id_groupe}, le groupe étant le plus petit id."""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in edges:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return {x: find(x) for x in parent}
+
+
+def add_equivalence(conn, reference_a, reference_b):
+    """Déclare deux consommables interchangeables et fusionne leurs groupes."""
+    cursor = conn.cursor()
+    a = _find_consumable(cursor, reference_a)
+    b = _find_consumable(cursor, reference_b)
+    if a == b:
+        return
+    a, b = min(a, b), max(a, b)
+    cursor.execute(
+        "INSERT OR IGNORE INTO equivalences (id_consommable_a, id_consommable_b) VALUES (?, ?)", (a, b)
+    )
+
+    group_a = _group_of(cursor, a) or a
+    group_b = _group_of(cursor, b) or b
+    group = min(group_a, group_b)
+
+    # Fusion : seuls les membres des deux groupes sont réécrits
+    cursor.execute(
+        "UPDATE groupes_equivalence SET id_groupe = ? WHERE id_groupe IN (?, ?)", (group, group_a, group_b)
+    )
+    cursor.executemany(
+        "INSERT OR IGNORE INTO groupes_equivalence (id_consommable, id_groupe) VALUES (?, ?)",
+        [(a, group), (b, group)],
+    )
+    conn.commit()
+
+
+def remove_equivalence(conn, reference_a, reference_b):
+    """
+    Supprime un lien ; seul le groupe concerné est recalculé.
+    Lève ValueError s'il n'y a pas de lien direct (équivalence obtenue par transitivité).
+    """
+    cursor = conn.cursor()
+    a = _find_consumable(cursor, reference_a)
+    b = _find_consumable(cursor, reference_b)
+    a, b = min(a, b), max(a, b)
+    cursor.execute(
+        "DELETE FROM equivalences WHERE id_consommable_a = ? AND id_consommable_b = ?", (a, b)
+    )
+    if not cursor.rowcount:
+        raise ValueError(
+            f"Pas de lien direct entre {reference_a} et {reference_b} : "
+            "l'équivalence passe par une autre référence"
+        )
+    group = _group_of(cursor, a)
+    if group is not None:
+        _rebuild_group(cursor, group)
+    conn.commit()
+
+
+def _rebuild_group(cursor, group):
+    """Recalcule les composantes d'un ancien groupe (il a pu se scinder)."""
+    cursor.execute("SELECT id_consommable FROM groupes_equivalence WHERE id_groupe = ?", (group,))
+    members = [row[0] for row in cursor.fetchall()]
+    cursor.execute(f"""
+        SELECT id_consommable_a, id_consommable_b FROM equivalences
+        WHERE id_consommable_a IN ({",".join("?" * len(members))})
+    """, members)
+    components = _components(cursor.fetchall())
+
+    cursor.execute("DELETE FROM groupes_equivalence WHERE id_groupe = ?", (group,))
+    cursor.executemany(
+        "INSERT INTO groupes_equivalence (id_consommable, id_groupe) VALUES (?, ?)",
+        components.items(),
+    )
+
+
+def rebuild_groups(conn):
+    """Recalcule tous les groupes à partir des liens (après un import ou un nettoyage)."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id_consommable_a, id_consommable_b FROM equivalences")
+    components = _components(cursor.fetchall())
+    cursor.execute("DELETE FROM groupes_equivalence")
+    cursor.executemany(
+        "INSERT INTO groupes_equivalence (id_consommable, id_groupe) VALUES (?, ?)",
+        components.items(),
+    )
+    conn.commit()
+
+
+def get_direct_links(conn, consumable_id):
+    """Références des consommables liés directement (liens saisis) à `consumable_id`."""
+    cursor = conn.execute("""
+        SELECT c.reference FROM equivalences e JOIN consommables c ON c.id = e.id_consommable_b
+        WHERE e.id_consommable_a = ?
+        UNION
+        SELECT c.reference FROM equivalences e JOIN consommables c ON c.id = e.id_consommable_a
+        WHERE e.id_consommable_b = ?
+    """, (consumable_id, consumable_id))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def get_substitutes(conn, consumable_ids):
+    """
+    Équivalents de plusieurs consommables en une requête indexée.
+    Retourne {id_consommable: [(type, reference), ...]}.
+    """
+    consumable_ids = list(consumable_ids)
+    if not consumable_ids:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT g.id_consommable, s.type, s.reference
+        FROM groupes_equivalence g
+        JOIN groupes_equivalence gs ON gs.id_groupe = g.id_groupe AND gs.id_consommable <> g.id_consommable
+        JOIN consommables s ON s.id = gs.id_consommable
+        WHERE g.id_consommable IN ({",".join("?" * len(consumable_ids))})
+        ORDER BY s.reference
+    """, consumable_ids)
+    substitutes = {}
+    for consumable_id, ctype, reference in cursor.fetchall():
+        substitutes.setdefault(consumable_id, []).append((ctype, reference))
+    return substitutes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Équivalences entre consommables")
+    parser.add_argument("action", choices=["lier", "delier", "liste", "reconstruire"])
+    parser.add_argument("references", nargs="*")
+    args = parser.parse_args()
+
+    expected = {"lier": 2, "delier": 2, "liste": 1, "reconstruire": 0}[args.action]
+    if len(args.references) != expected:
+        parser.error(f"{args.action} attend {expected} référence(s)")
+
+    conn = get_db_connection()
+    create_schema(conn)
+    try:
+        if args.action == "lier":
+            add_equivalence(conn, *args.references)
+        elif args.action == "delier":
+            remove_equivalence(conn, *args.references)
+        elif args.action == "reconstruire":
+            rebuild_groups(conn)
+        else:
+            consumable_id = _find_consumable(conn.cursor(), args.references[0])
+            for ctype, reference in get_substitutes(conn, [consumable_id]).get(consumable_id, []):
+                print(f"{reference} ({ctype})")
+    except ValueError as e:
+        sys.exit(str(e))
+    finally:
+        conn.close()
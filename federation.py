@@ -0,0 +1,275 @@
+"""
+Recherche fédérée sur plusieurs catalogues de fournisseurs.
+
+Les catalogues (même schéma que printers.db, voir db.create_database) sont
+déclarés dans la table `catalogues_fournisseurs` de la base principale, mis à
+niveau une seule fois à la déclaration, puis attachés en lecture seule à une
+même connexion : les fichiers des fournisseurs ne sont jamais réécrits ensuite. Chaque recherche est une seule requête
+UNION ALL : une branche par catalogue, qui utilise les index de ce catalogue,
+puis les résultats sont fusionnés par clé normalisée et classés.
+
+Les identifiants diffèrent d'un fichier à l'autre : marques, modèles et
+consommables sont rapprochés par nom et par référence.
+
+Utilisation :
+    python federation.py ajouter NOM chemin/vers/catalogue.db
+    python federation.py retirer NOM
+    python federation.py liste
+    python federation.py chercher HP "LASERJET P1102" [--suggestions]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from db import create_schema, get_db_path, normalize_key
+from equivalences import substitutes_sql
+
+MAIN_SOURCE = "principal"  # Nom affiché pour printers.db
+MAX_ATTACHED = 10          # Limite par défaut de SQLite (SQLITE_MAX_ATTACHED)
+SUGGESTION_LIMIT = 10      # Même limite que les suggestions de PrinterApp
+CANDIDATES = 50            # Noms lus au plus par catalogue pour une suggestion
+
+# Colonnes lues par les requêtes fédérées dans chaque catalogue
+REQUIRED_COLUMNS = {
+    "marques": {"id", "nom"},
+    "modeles": {"id", "nom", "id_marque", "nom_cle"},
+    "modeles_consommables": {"id_modele", "id_consommable"},
+    "consommables": {"id", "type", "reference", "reference_cle", "prix", "rendement"},
+    "groupes_equivalence": {"id_consommable", "id_groupe"},
+}
+
+# Popularité d'un modèle : seul printers.db tient l'historique des recherches
+POPULARITY_SQL = "COALESCE((SELECT h.compteur FROM main.historique_recherches h WHERE h.id_modele = m.id), 0)"
+
+
+def _missing_columns(conn, schema):
+    """Colonnes requises absentes du catalogue attaché sous `schema` ("table.colonne")."""
+    missing = []
+    for table, columns in REQUIRED_COLUMNS.items():
+        present = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+        missing.extend(f"{table}.{column}" for column in sorted(columns - present))
+    return missing
+
+
+def upgrade_catalog(path):
+    """
+    Met à niveau un catalogue de fournisseur au moment de sa déclaration.
+    Un fichier en lecture seule est accepté s'il a déjà toutes les colonnes requises.
+    Lève ValueError si le catalogue est illisible ou inutilisable.
+    """
+    try:
+        catalog = sqlite3.connect(path)
+        try:
+            create_schema(catalog)
+        except sqlite3.OperationalError:
+            pass  # Lecture seule : vérifié ci-dessous
+        finally:
+            catalog.close()
+        check = sqlite3.connect(":memory:", uri=True)
+        try:
+            check.execute("ATTACH DATABASE ? AS catalogue", (f"file:{path}?mode=ro",))
+            missing = _missing_columns(check, "catalogue")
+        finally:
+            check.close()
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"Catalogue illisible : {path} ({e})")
+    if missing:
+        raise ValueError(f"Catalogue en lecture seule dans un ancien schéma, colonnes absentes : {', '.join(missing)}")
+
+
+def attach_catalogs(conn):
+    """
+    Attache les catalogues déclarés à `conn`, en lecture seule (`conn` doit être
+    ouverte avec uri=True). Un catalogue illisible, ou dont le schéma est trop
+    ancien, est ignoré avec un avertissement sur stderr.
+    Retourne [(schéma, nom affiché)], la base principale en premier.
+    """
+    sources = [("main", MAIN_SOURCE)]
+    declared = conn.execute("SELECT nom, chemin FROM catalogues_fournisseurs ORDER BY nom").fetchall()
+    for name, path in declared[:MAX_ATTACHED]:
+        if not os.path.exists(path):
+            continue  # Catalogue déplacé ou partage réseau absent : ignoré
+        schema = f"fournisseur_{len(sources)}"
+        try:
+            conn.execute("ATTACH DATABASE ? AS " + schema, (f"file:{path}?mode=ro",))
+            missing = _missing_columns(conn, schema)
+        except sqlite3.DatabaseError as e:
+            # Fichier qui n'est pas une base SQLite, corrompu, verrouillé...
+            print(f"Catalogue {name} ignoré ({path}) : {e}", file=sys.stderr)
+            if schema in [row[1] for row in conn.execute("PRAGMA database_list")]:
+                conn.execute("DETACH DATABASE " + schema)
+            continue
+        if missing:
+            print(f"Catalogue {name} ignoré ({path}) : schéma ancien, colonnes absentes : {', '.join(missing)} "
+                  f"(le déclarer à nouveau avec `python federation.py ajouter` pour le mettre à niveau)",
+                  file=sys.stderr)
+            conn.execute("DETACH DATABASE " + schema)
+            continue
+        sources.append((schema, name))
+    return sources
+
+
+class Federation:
+    """Connexion persistante à la base principale et aux catalogues attachés."""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, uri=True)  # uri : catalogues attachés en lecture seule
+        self.sources = attach_catalogs(self.conn)
+
+    @property
+    def active(self):
+        """Vrai si au moins un catalogue de fournisseur est attaché."""
+        return len(self.sources) > 1
+
+    def _union(self, branch, params):
+        """
+        Une branche par catalogue ({db} : schéma, {substitutes} : équivalents dans ce schéma,
+        {popularity} : nombre de recherches du modèle `m`, 0 hors de printers.db).
+        Retourne (SQL, paramètres) de l'UNION ALL ; chaque branche commence par le nom du catalogue.
+        """
+        sql = "\nUNION ALL\n".join(
+            branch.format(
+                db=schema,
+                substitutes=substitutes_sql(schema),
+                popularity=POPULARITY_SQL if schema == "main" else "0",
+            )
+            for schema, _ in self.sources
+        )
+        values = []
+        for _, name in self.sources:
+            values.extend((name, *params))
+        return sql, values
+
+    def brands(self):
+        """Marques présentes seulement dans les catalogues de fournisseurs."""
+        union = "\nUNION\n".join(f"SELECT nom FROM {schema}.marques" for schema, _ in self.sources[1:])
+        if not union:
+            return []
+        return [row[0] for row in self.conn.execute(f"{union} EXCEPT SELECT nom FROM main.marques ORDER BY 1")]
+
+    def suggest(self, brand_name, text, limit=SUGGESTION_LIMIT):
+        """
+        Modèles de la marque dont le nom contient `text`, tous catalogues confondus.
+        Classement : début du nom, puis popularité (historique des recherches de
+        printers.db, comme les suggestions locales), puis nombre de catalogues qui
+        le proposent, puis nom.
+        Retourne [(nom, [catalogues])].
+        """
+        key = normalize_key(text)
+        if not key:
+            return []
+        # Les clés ne contiennent que [0-9A-Z] : key + "[" borne l'intervalle des noms
+        # commençant par key, parcouru sur l'index (id_marque, nom_cle) de chaque catalogue
+        models = self._suggest(brand_name, "m.nom_cle >= ? AND m.nom_cle < ?", (key, key + "["), key, limit)
+        if len(models) < limit:
+            # Pas assez de débuts de nom : recherche dans tout le nom (parcours de la marque)
+            models = self._suggest(brand_name, "m.nom_cle LIKE ?", (f"%{key}%",), key, limit)
+        return models
+
+    def _suggest(self, brand_name, condition, condition_params, key, limit):
+        # Chaque branche s'arrête après CANDIDATES noms (les plus recherchés d'abord
+        # dans printers.db, dans l'ordre de l'index ailleurs) : le coût par catalogue
+        # reste borné, quel que soit le nombre de noms correspondants
+        union, params = self._union(f"""
+            SELECT * FROM (
+                SELECT m.nom AS nom, m.nom_cle AS cle, ? AS source, {{popularity}} AS popularite
+                FROM {{db}}.marques b
+                JOIN {{db}}.modeles m ON m.id_marque = b.id
+                WHERE b.nom = ? AND {condition}
+                ORDER BY popularite DESC, m.nom_cle
+                LIMIT {CANDIDATES}
+            )
+        """, (brand_name, *condition_params))
+        cursor = self.conn.execute(f"""
+            SELECT MIN(nom), GROUP_CONCAT(source, ', ')
+            FROM ({union})
+            GROUP BY cle
+            ORDER BY MAX(cle LIKE ?) DESC, MAX(popularite) DESC, COUNT(*) DESC, MIN(nom)
+            LIMIT ?
+        """, (*params, f"{key}%", limit))
+        return [(name, sources.split(", ")) for name, sources in cursor.fetchall()]
+
+    def consumables(self, brand_name, model_name):
+        """
+        Consommables du modèle dans tous les catalogues, fusionnés par référence.
+        Classement : coût à la page le plus bas (tarifés d'abord), puis référence.
+        Retourne [(type, reference, équivalents, [catalogues])].
+        """
+        union, params = self._union("""
+            SELECT c.type, c.reference, c.reference_cle, c.prix / c.rendement, ? AS source,
+                   {substitutes}
+            FROM {db}.marques b
+            JOIN {db}.modeles m ON m.id_marque = b.id
+            JOIN {db}.modeles_consommables mc ON mc.id_modele = m.id
+            JOIN {db}.consommables c ON c.id = mc.id_consommable
+            WHERE b.nom = ? AND m.nom_cle = ?
+        """, (brand_name, normalize_key(model_name)))
+        cursor = self.conn.execute(union, params)
+
+        merged = {}  # clé de référence -> [type, reference, équivalents, catalogues, coût à la page]
+        for ctype, reference, key, cost, source, substitutes in cursor.fetchall():
+            entry = merged.setdefault(key, [ctype, reference, [], [], None])
+            for substitute in (substitutes.split(", ") if substitutes else []):
+                if substitute not in entry[2]:
+                    entry[2].append(substitute)
+            entry[3].append(source)
+            if cost is not None and (entry[4] is None or cost < entry[4]):
+                entry[4] = cost
+
+        ranked = sorted(merged.values(), key=lambda e: (e[4] is None, e[4] or 0, e[1]))
+        return [(ctype, reference, ", ".join(subs), sources) for ctype, reference, subs, sources, _ in ranked]
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Catalogues de fournisseurs et recherche fédérée")
+    parser.add_argument("action", choices=["ajouter", "retirer", "liste", "chercher"])
+    parser.add_argument("arguments", nargs="*")
+    parser.add_argument("-s", "--suggestions", action="store_true",
+                        help="chercher : lister les modèles dont le nom contient le texte")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(get_db_path())
+    create_schema(conn)
+    if args.action == "ajouter":
+        if len(args.arguments) != 2:
+            parser.error("ajouter attend NOM CHEMIN")
+        name, path = args.arguments
+        if not os.path.exists(path):
+            sys.exit(f"Fichier introuvable : {path}")
+        try:
+            upgrade_catalog(path)
+        except ValueError as e:
+            sys.exit(str(e))
+        conn.execute("INSERT OR REPLACE INTO catalogues_fournisseurs (nom, chemin) VALUES (?, ?)",
+                     (name, os.path.abspath(path)))
+        conn.commit()
+    elif args.action == "retirer":
+        if len(args.arguments) != 1:
+            parser.error("retirer attend NOM")
+        if not conn.execute("DELETE FROM catalogues_fournisseurs WHERE nom = ?", args.arguments).rowcount:
+            sys.exit(f"Catalogue inconnu : {args.arguments[0]}")
+        conn.commit()
+    elif args.action == "liste":
+        for name, path in conn.execute("SELECT nom, chemin FROM catalogues_fournisseurs ORDER BY nom"):
+            print(f"{name}  {path}" + ("" if os.path.exists(path) else "  (introuvable)"))
+    conn.close()
+
+    if args.action == "chercher":
+        if len(args.arguments) != 2:
+            parser.error("chercher attend MARQUE MODELE")
+        brand, model = args.arguments[0].upper(), args.arguments[1]
+        federation = Federation(get_db_path())
+        if args.suggestions:
+            rows = [f"{name}  ({', '.join(sources)})" for name, sources in federation.suggest(brand, model)]
+        else:
+            rows = [
+                f"{reference} ({ctype})" + (f" - équivalents : {subs}" if subs else "") + f"  [{', '.join(sources)}]"
+                for ctype, reference, subs, sources in federation.consumables(brand, model)
+            ]
+        federation.close()
+        print("\n".join(rows) if rows else "Aucun résultat.")
+        sys.exit(0 if rows else 1)
@@ -0,0 +1,106 @@
+"""
+Historique des recherches de modèles.
+
+Chaque consultation réussie est comptée en mémoire puis écrite par lots dans la
+table `historique_recherches`. Au démarrage, les modèles les plus consultés et
+leurs consommables sont préchargés pour répondre sans requête SQL.
+"""
+import time
+
+from db import normalize_key
+from equivalences import SUBSTITUTES_SQL
+
+FLUSH_EVERY = 20      # Nombre de consultations avant écriture groupée
+WARM_LIMIT = 300      # Nombre de modèles populaires préchargés au démarrage
+SUGGESTION_LIMIT = 10 # Même limite que les suggestions de PrinterApp
+
+
+class LookupHistory:
+    """Compteur de consultations avec écritures groupées."""
+
+    def __init__(self, flush_every=FLUSH_EVERY):
+        self.flush_every = flush_every
+        self.pending = {}  # id_modele -> nombre de consultations non écrites
+
+    def record(self, model_id):
+        """
+        Enregistre une consultation. Retourne True quand un lot est prêt à être écrit.
+        """
+        self.pending[model_id] = self.pending.get(model_id, 0) + 1
+        return sum(self.pending.values()) >= self.flush_every
+
+    def flush(self, conn):
+        """Écrit les consultations en attente en une seule transaction."""
+        if not self.pending:
+            return
+        now = int(time.time())
+        conn.executemany("""
+            INSERT INTO historique_recherches (id_modele, compteur, derniere_recherche)
+            VALUES (?, ?, ?)
+            ON CONFLICT (id_modele) DO UPDATE SET
+                compteur = compteur + excluded.compteur,
+                derniere_recherche = excluded.derniere_recherche
+        """, [(model_id, count, now) for model_id, count in self.pending.items()])
+        conn.commit()
+        self.pending.clear()
+
+
+class WarmCache:
+    """
+    Modèles populaires préchargés : consommables par (marque, modèle) et noms
+    classés par popularité pour chaque marque.
+    """
+
+    def __init__(self):
+        self.consumables = {}  # (id_marque, clé du nom) -> [(id, type, reference, équivalents), ...]
+        self.model_ids = {}    # (id_marque, clé du nom) -> id du modèle
+        self.popular = {}      # id_marque -> [(nom, clé), ...] du plus au moins consulté
+
+    def load(self, conn, limit=WARM_LIMIT):
+        """Précharge les `limit` modèles les plus consultés en une seule requête."""
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT m.id, m.id_marque, m.nom, m.nom_cle, c.id, c.type, c.reference,
+                   {SUBSTITUTES_SQL}
+            FROM (
+                SELECT id_modele, compteur FROM historique_recherches
+                ORDER BY compteur DESC
+                LIMIT ?
+            ) h
+            JOIN modeles m ON m.id = h.id_modele
+            LEFT JOIN modeles_consommables mc ON mc.id_modele = m.id
+            LEFT JOIN consommables c ON c.id = mc.id_consommable
+            ORDER BY h.compteur DESC, m.nom
+        """, (limit,))
+
+        self.consumables.clear()
+        self.model_ids.clear()
+        self.popular.clear()
+        for model_id, brand_id, model_name, model_key, cid, ctype, cref, substitutes in cursor.fetchall():
+            key = (brand_id, model_key)
+            if key not in self.consumables:
+                self.consumables[key] = []
+                self.model_ids[key] = model_id
+                self.popular.setdefault(brand_id, []).append((model_name, model_key))
+            if cid is not None:
+                self.consumables[key].append((cid, ctype, cref, substitutes))
+
+    def get_consumables(self, brand_id, model_name):
+        """Retourne les consommables préchargés, ou None si le modèle n'est pas en cache."""
+        return self.consumables.get((brand_id, normalize_key(model_name)))
+
+    def get_model_id(self, brand_id, model_name):
+        return self.model_ids.get((brand_id, normalize_key(model_name)))
+
+    def suggest(self, brand_id, text, limit=SUGGESTION_LIMIT):
+        """
+        Suggestions depuis le cache. Retourne None si le cache ne suffit pas à
+        remplir la liste : il faut alors interroger la base.
+        Les débuts de nom passent avant tout autre modèle (même classement que
+        la base) : le cache ne suffit que s'il en contient assez.
+        """
+        key = normalize_key(text)
+        matches = [name for name, name_key in self.popular.get(brand_id, []) if name_key.startswith(key)]
+        if len(matches) < limit:
+            return None
+        return matches[:limit]
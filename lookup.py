@@ -0,0 +1,133 @@
+"""
+Recherche en ligne de commande, sans PyQt : pensée pour être appelée en boucle
+depuis des scripts de commande.
+
+Utilisation :
+    python lookup.py HP "LASERJET P1102"          consommables d'un modèle
+    python lookup.py HP LASERJET --suggestions    modèles dont le nom contient le texte
+    python lookup.py --reference CE285A           imprimantes compatibles avec un consommable
+    ajouter --json pour une sortie JSON, --db pour un autre fichier
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from db import create_schema, get_db_path, normalize_key
+from equivalences import SUBSTITUTES_SQL
+
+SUGGESTION_LIMIT = 50
+
+
+def open_catalog(db_path):
+    """Ouvre la base en lecture seule (pas de verrou d'écriture, pas de journal)."""
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+
+def find_consumables(conn, brand, model):
+    cursor = conn.execute(f"""
+        SELECT b.nom, m.nom, c.type, c.reference, {SUBSTITUTES_SQL}
+        FROM marques b
+        JOIN modeles m ON m.id_marque = b.id
+        JOIN modeles_consommables mc ON mc.id_modele = m.id
+        JOIN consommables c ON c.id = mc.id_consommable
+        WHERE b.nom = ? AND m.nom_cle = ?
+        ORDER BY c.reference
+    """, (brand.upper(), normalize_key(model)))
+    return [
+        {"marque": b, "modele": m, "type": t, "reference": r, "equivalents": s.split(", ") if s else []}
+        for b, m, t, r, s in cursor.fetchall()
+    ]
+
+
+def find_models(conn, brand, text):
+    cursor = conn.execute("""
+        SELECT b.nom, m.nom
+        FROM marques b
+        JOIN modeles m ON m.id_marque = b.id
+        LEFT JOIN historique_recherches h ON h.id_modele = m.id
+        WHERE b.nom = ? AND m.nom_cle LIKE ?
+        ORDER BY m.nom_cle LIKE ? DESC, COALESCE(h.compteur, 0) DESC, m.nom
+        LIMIT ?
+    """, (brand.upper(), f"%{normalize_key(text)}%", f"{normalize_key(text)}%", SUGGESTION_LIMIT))
+    return [{"marque": b, "modele": m} for b, m in cursor.fetchall()]
+
+
+def find_printers(conn, reference):
+    cursor = conn.execute("""
+        SELECT b.nom, m.nom, c.reference
+        FROM consommables c
+        JOIN modeles_consommables mc ON mc.id_consommable = c.id
+        JOIN modeles m ON m.id = mc.id_modele
+        JOIN marques b ON b.id = m.id_marque
+        WHERE c.reference_cle = ?
+        ORDER BY b.nom, m.nom
+    """, (normalize_key(reference),))
+    return [{"marque": b, "modele": m, "reference": r} for b, m, r in cursor.fetchall()]
+
+
+def print_table(rows):
+    if not rows:
+        return
+    columns = list(rows[0])
+    cells = [[", ".join(v) if isinstance(v, list) else str(v) for v in row.values()] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)).rstrip())
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)).rstrip())
+
+
+def build_query(args):
+    """Choisit la recherche demandée ; retourne une fonction conn -> lignes."""
+    if args.reference:
+        return lambda conn: find_printers(conn, args.reference)
+    if args.suggestions:
+        return lambda conn: find_models(conn, args.marque, args.modele)
+    return lambda conn: find_consumables(conn, args.marque, args.modele)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recherche de consommables compatibles")
+    parser.add_argument("marque", nargs="?")
+    parser.add_argument("modele", nargs="?")
+    parser.add_argument("-s", "--suggestions", action="store_true",
+                        help="Lister les modèles dont le nom contient MODELE")
+    parser.add_argument("-r", "--reference", help="Imprimantes compatibles avec cette référence")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    parser.add_argument("--db", default=None, help="Chemin de la base (défaut : printers.db)")
+    args = parser.parse_args()
+
+    if not args.reference and not (args.marque and args.modele):
+        parser.error("indiquer MARQUE MODELE ou --reference REF")
+
+    db_path = args.db or get_db_path()
+    if not os.path.isfile(db_path):
+        # Code 2 : distinct de 1 (aucun résultat) pour les scripts appelants
+        print(f"Base introuvable : {db_path}", file=sys.stderr)
+        sys.exit(2)
+    query = build_query(args)
+    conn = open_catalog(db_path)
+    try:
+        try:
+            rows = query(conn)
+        except sqlite3.OperationalError:
+            # Base d'une version précédente : la mettre à niveau une fois, puis relire
+            conn.close()
+            print(f"Mise à niveau du schéma de {db_path}", file=sys.stderr)
+            conn = sqlite3.connect(db_path)
+            create_schema(conn)
+            rows = query(conn)
+    except sqlite3.DatabaseError as e:
+        # Fichier qui n'est pas une base, ou mise à niveau impossible (lecture seule)
+        print(f"Lecture impossible de {db_path} : {e}", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        conn.close()
+
+    if args.json:
+        import json  # Import local : seulement pour la sortie JSON
+        json.dump(rows, sys.stdout, ensure_ascii=False)
+        print()
+    else:
+        print_table(rows)
+    sys.exit(0 if rows else 1)
@@ -1,29 +1,26 @@
 import sys
-import os
 import sqlite3
-import shutil
+import threading
+import time
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QVBoxLayout, QHBoxLayout, QComboBox, QListWidget, QAction, 
-    QPushButton, QFormLayout, QDialog, QMessageBox, QListWidgetItem, QFrame, QMainWindow
+    QPushButton, QFormLayout, QDialog, QMessageBox, QListWidgetItem, QFrame, QMainWindow,
+    QPlainTextEdit, QFileDialog
 )
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont
-
-def get_db_connection():
-    if getattr(sys, 'frozen', False):
-        # Chemin vers la base de données dans le dossier temporaire
-        db_path = os.path.join(sys._MEIPASS, 'printers.db')
-        # Vérifier si la base de données existe déjà dans le répertoire temporaire
-        if not os.path.exists(db_path):
-            # Copier la base de données initiale depuis le dossier des ressources
-            initial_db_path = os.path.join(sys._MEIPASS, 'data', 'printers.db')
-            shutil.copy(initial_db_path, db_path)
-    else:
-        # Si non gelé, utilisez le chemin local
-        db_path = 'printers.db'
-    
-    conn = sqlite3.connect(db_path)
-    return conn
+from db import create_schema, fill_missing_keys, get_db_connection, get_db_path, normalize_key
+from history import LookupHistory, WarmCache
+from batch import resolve_models, export_csv
+from equivalences import SUBSTITUTES_SQL, add_equivalence, remove_equivalence, get_direct_links, get_substitutes
+from maintenance import idle_maintenance
+from changes import ChangeDetector
+from barcodes import normalize_barcode, lookup_barcode, check_barcode_free
+from federation import Federation
+
+IDLE_MAINTENANCE_MS = 5 * 60 * 1000  # Inactivité avant la maintenance en arrière-plan
+CHANGE_POLL_MS = 1000                # Intervalle de détection des modifications du catalogue
+SCAN_KEY_INTERVAL_MS = 30            # Touches plus rapprochées : lecteur de codes-barres
 
 def set_global_font(size):
     font = QFont("Verdana", size)  # Vous pouvez changer "Arial" pour une autre police
@@ -165,8 +162,12 @@ class AjouterWindow(QDialog):
             QMessageBox.warning(self, "!!", "Veuillez entrer un modèle valide.")
             return
 
-        if any(model_name == self.models_list.itemWidget(self.models_list.item(i)).model_label.text()
-               for i in range(self.models_list.count())):
+        # Comparer les clés : "MFP M130" et "MFP-M130" désignent le même modèle
+        listed_keys = {
+            normalize_key(self.models_list.itemWidget(self.models_list.item(i)).model_label.text())
+            for i in range(self.models_list.count())
+        }
+        if normalize_key(model_name) in listed_keys:
             QMessageBox.warning(self, "!!", "Ce modèle existe déjà dans la liste.")
             return
 
@@ -251,18 +252,34 @@ class AjouterWindow(QDialog):
         conn = get_db_connection()
         cursor = conn.cursor()
         try:
-            # Insert models and consumables
-            for model in models:
-                cursor.execute("INSERT INTO modeles (nom, id_marque) VALUES (?, ?)", (model, marque_id))
-                model_id = cursor.lastrowid
+            # Reuse an existing consumable even if it was typed with other punctuation
+            cursor.execute("SELECT id FROM consommables WHERE reference_cle = ?", (normalize_key(reference),))
+            existing_consumable = cursor.fetchone()
+            if existing_consumable:
+                consumable_id = existing_consumable[0]
+            else:
+                cursor.execute(
+                    "INSERT INTO consommables (reference, type, reference_cle) VALUES (?, ?, ?)",
+                    (reference, consumable_type, normalize_key(reference)),
+                )
+                consumable_id = cursor.lastrowid
 
-                # Insert consumable
+            # Insert models and link them to the consumable; a model already
+            # present in this brand under another spelling is reused
+            for model in models:
                 cursor.execute(
-                    "INSERT OR IGNORE INTO consommables (reference, type) VALUES (?, ?)",
-                    (reference, consumable_type),
+                    "SELECT id FROM modeles WHERE id_marque = ? AND nom_cle = ?",
+                    (marque_id, normalize_key(model)),
                 )
-                cursor.execute("SELECT id FROM consommables WHERE reference = ?", (reference,))
-                consumable_id = cursor.fetchone()[0]
+                existing_model = cursor.fetchone()
+                if existing_model:
+                    model_id = existing_model[0]
+                else:
+                    cursor.execute(
+                        "INSERT INTO modeles (nom, id_marque, nom_cle) VALUES (?, ?, ?)",
+                        (model, marque_id, normalize_key(model)),
+                    )
+                    model_id = cursor.lastrowid
 
                 # Link model and consumable
                 cursor.execute(
@@ -278,14 +295,14 @@ class AjouterWindow(QDialog):
             conn.rollback()
             QMessageBox.critical(self, "!!", f"Une erreur est survenue : {e}")
         finally:
-            self.parent.reset_search()  # Appeler la méthode de la fenêtre principale
             conn.close()
 
 class ModifierWindow(QWidget):
-    def __init__(self, model_name, consumable_data, parent=None):
+    def __init__(self, model_name, brand_id, consumable_data, parent=None):
         super().__init__()
         self.parent = parent
         self.model_name = model_name
+        self.brand_id = brand_id
         self.consumable_id = consumable_data[0]  # ID of the consumable
         self.initUI(consumable_data)
 
@@ -368,10 +385,10 @@ class ModifierWindow(QWidget):
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Vérifier si le consommable existe déjà
+        # Vérifier si le consommable existe déjà (même clé normalisée)
         cursor.execute("""
-            SELECT id FROM consommables WHERE reference = ?
-        """, (new_reference,))
+            SELECT id FROM consommables WHERE reference_cle = ?
+        """, (normalize_key(new_reference),))
         existing_consumable = cursor.fetchone()
 
         if existing_consumable:
@@ -380,19 +397,24 @@ class ModifierWindow(QWidget):
         else:
             # Consommable non existant, l'ajouter
             cursor.execute("""
-                INSERT INTO consommables (type, reference)
-                VALUES (?, ?)
-            """, (new_type, new_reference))
+                INSERT INTO consommables (type, reference, reference_cle)
+                VALUES (?, ?, ?)
+            """, (new_type, new_reference, normalize_key(new_reference)))
             consumable_id = cursor.lastrowid
 
-        # Récupérer l'ID du modèle
+        # Récupérer l'ID du modèle dans sa marque (la clé seule n'est pas unique)
         cursor.execute("""
-            SELECT id FROM modeles WHERE nom = ?
-        """, (self.model_name,))
-        model_id = cursor.fetchone()
+            SELECT id FROM modeles WHERE id_marque = ? AND nom_cle = ?
+        """, (self.brand_id, normalize_key(self.model_name)))
+        model_ids = cursor.fetchall()
+        if len(model_ids) > 1:
+            conn.rollback()
+            conn.close()
+            QMessageBox.warning(self, "!!", f"Plusieurs modèles correspondent à {self.model_name}.")
+            return
 
-        if model_id:
-            model_id = model_id[0]
+        if model_ids:
+            model_id = model_ids[0][0]
 
             # Supprimer l'association existante pour ce modèle
             cursor.execute("""
@@ -408,7 +430,7 @@ class ModifierWindow(QWidget):
         conn.commit()
         conn.close()
         
-        self.parent.reset_search()  # Appeler la méthode de la fenêtre principale
+        self.parent.check_catalog()  # Rafraîchir uniquement ce qui a changé
 
         # Fermer la fenêtre après sauvegarde
         self.close()
@@ -490,9 +512,54 @@ class ModifierConsumableWindow(QWidget):
         enforce_uppercase(self.reference_input)
         modify_layout.addRow(reference_label, self.reference_input)
 
+        # Champ Code-barres (EAN/UPC), vide si la boîte n'en porte pas
+        barcode_label = QLabel("Code-barres :", self)
+        self.barcode_input = QLineEdit(self)
+        self.barcode_input.setPlaceholderText("Scanner la boîte")
+        self.barcode_input.setStyleSheet(input_style)
+        modify_layout.addRow(barcode_label, self.barcode_input)
+
+        # Champs du coût à la page (voir costs.py), vides si inconnus
+        self.yield_input = QLineEdit(self)
+        self.yield_input.setPlaceholderText("Pages par consommable")
+        self.yield_input.setStyleSheet(input_style)
+        modify_layout.addRow(QLabel("Rendement :", self), self.yield_input)
+
+        self.price_input = QLineEdit(self)
+        self.price_input.setPlaceholderText("Prix unitaire")
+        self.price_input.setStyleSheet(input_style)
+        modify_layout.addRow(QLabel("Prix :", self), self.price_input)
+
+        self.origin_input = QComboBox(self)
+        self.origin_input.addItems(["", "CONSTRUCTEUR", "COMPATIBLE"])
+        self.origin_input.setStyleSheet(input_style)
+        modify_layout.addRow(QLabel("Origine :", self), self.origin_input)
+
         # Ajout du bloc de modification au layout principal
         main_layout.addLayout(modify_layout)
 
+        # **Équivalents du consommable sélectionné**
+        equivalence_layout = QFormLayout()
+        self.equivalents_list = QListWidget(self)
+        self.equivalents_list.setStyleSheet(list_style)
+        equivalence_layout.addRow(QLabel("Équivalents :", self), self.equivalents_list)
+
+        equivalent_input_layout = QHBoxLayout()
+        self.equivalent_input = QLineEdit(self)
+        self.equivalent_input.setPlaceholderText("Référence équivalente")
+        self.equivalent_input.setStyleSheet(input_style)
+        enforce_uppercase(self.equivalent_input)
+        link_button = QPushButton("Lier", self)
+        link_button.clicked.connect(self.link_equivalent)
+        unlink_button = QPushButton("Délier", self)
+        unlink_button.clicked.connect(self.unlink_equivalent)
+        equivalent_input_layout.addWidget(self.equivalent_input)
+        equivalent_input_layout.addWidget(link_button)
+        equivalent_input_layout.addWidget(unlink_button)
+        equivalence_layout.addRow(equivalent_input_layout)
+
+        main_layout.addLayout(equivalence_layout)
+
         # **Bouton Sauvegarder**
         save_button = QPushButton("Sauvegarder", self)
         save_button.setStyleSheet("""
@@ -513,17 +580,19 @@ class ModifierConsumableWindow(QWidget):
         """Charger tous les consommables dans la liste."""
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT id, type, reference FROM consommables")
+        cursor.execute("SELECT id, type, reference, reference_cle FROM consommables")
         results = cursor.fetchall()
         conn.close()
 
-        self.all_consumables = results  # Stocker tous les consommables
+        self.all_consumables = [row[:3] for row in results]  # Stocker tous les consommables
+        # Clés normalisées par id ; calculées ici si une autre version a écrit la ligne sans clé
+        self.consumable_keys = {row[0]: row[3] or normalize_key(row[2]) for row in results}
         self.update_consumable_list(self.all_consumables)  # Afficher tous les consommables
 
     
     def search_consumable(self):
         """Filtrer les consommables en fonction de la recherche de l'utilisateur."""
-        reference = self.consumable_search_input.text().strip()  # Convertir en minuscules pour ignorer la casse
+        reference = normalize_key(self.consumable_search_input.text())  # Ignore casse, espaces et tirets
 
         if not reference:
             self.update_consumable_list(self.all_consumables)  # Si vide, réafficher tous les consommables
@@ -533,7 +602,7 @@ class ModifierConsumableWindow(QWidget):
         filtered_consumables = [
             (consumable_id, consumable_type, consumable_ref)
             for consumable_id, consumable_type, consumable_ref in self.all_consumables
-            if reference in consumable_ref  # Comparaison insensible à la casse
+            if reference in self.consumable_keys[consumable_id]
         ]
         
         # Mettre à jour la liste avec les résultats filtrés
@@ -559,6 +628,79 @@ class ModifierConsumableWindow(QWidget):
         self.reference_input.setText(reference)
         self.type_input.setCurrentText(consumable_type)
 
+        conn = get_db_connection()
+        row = conn.execute("""
+            SELECT code_barres, rendement, prix, origine FROM consommables WHERE reference = ?
+        """, (reference,)).fetchone()
+        conn.close()
+        barcode, page_yield, price, origin = row if row else (None, None, None, None)
+        self.barcode_input.setText(barcode or "")
+        self.yield_input.setText(str(page_yield) if page_yield is not None else "")
+        self.price_input.setText(f"{price:g}" if price is not None else "")
+        self.origin_input.setCurrentText(origin or "")
+
+        self.load_equivalents()
+
+    def load_equivalents(self):
+        """Afficher les équivalents du consommable sélectionné."""
+        self.equivalents_list.clear()
+        if not self.selected_reference:
+            return
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM consommables WHERE reference = ?", (self.selected_reference,))
+        row = cursor.fetchone()
+        substitutes = get_substitutes(conn, [row[0]]).get(row[0], []) if row else []
+        direct = get_direct_links(conn, row[0]) if row else set()
+        conn.close()
+
+        for ctype, reference in substitutes:
+            item = QListWidgetItem(f"{reference} ({ctype})", self.equivalents_list)
+            if reference not in direct:
+                # Équivalent par transitivité : pas de lien à retirer ici
+                item.setFlags(item.flags() & ~Qt.ItemIsSelectable)
+                item.setToolTip("Équivalent indirect (lié par une autre référence)")
+
+    def link_equivalent(self):
+        """Déclarer la référence saisie équivalente au consommable sélectionné."""
+        reference = self.equivalent_input.text().strip()
+        if not self.selected_reference or not reference:
+            return
+
+        conn = get_db_connection()
+        try:
+            add_equivalence(conn, self.selected_reference, reference)
+        except ValueError as e:
+            QMessageBox.warning(self, "!!", str(e))
+            return
+        finally:
+            conn.close()
+
+        self.equivalent_input.clear()
+        self.load_equivalents()
+        self.parent.check_catalog()
+
+    def unlink_equivalent(self):
+        """Retirer le lien direct avec l'équivalent sélectionné dans la liste."""
+        items = self.equivalents_list.selectedItems()  # Les équivalents indirects ne sont pas sélectionnables
+        if not self.selected_reference or not items:
+            return
+
+        reference = items[0].text().split(" (")[0]
+        conn = get_db_connection()
+        try:
+            remove_equivalence(conn, self.selected_reference, reference)
+        except ValueError as e:
+            conn.rollback()
+            QMessageBox.warning(self, "!!", str(e))
+            return
+        finally:
+            conn.close()
+
+        self.load_equivalents()
+        self.parent.check_catalog()
+
     def update_consumable(self):
         """Mettre à jour uniquement les champs du consommable sélectionné."""
         if not self.selected_reference:
@@ -571,27 +713,223 @@ class ModifierConsumableWindow(QWidget):
             QMessageBox.warning(self, "!!", "Veuillez entrer une référence pour l'encre.")
             return  # Ne pas poursuivre si le champ est vide
 
+        barcode = self.barcode_input.text().strip()
+        normalized_barcode = normalize_barcode(barcode) if barcode else None
+        if barcode and normalized_barcode is None:
+            QMessageBox.warning(self, "!!", f"Code-barres invalide : {barcode}")
+            return
+
+        try:
+            page_yield = int(self.yield_input.text()) if self.yield_input.text().strip() else None
+            price = float(self.price_input.text().replace(",", ".")) if self.price_input.text().strip() else None
+        except ValueError:
+            QMessageBox.warning(self, "!!", "Le rendement et le prix doivent être des nombres.")
+            return
+        if (page_yield is not None and page_yield <= 0) or (price is not None and price < 0):
+            QMessageBox.warning(self, "!!", "Le rendement doit être positif et le prix ne peut pas être négatif.")
+            return
+
         conn = get_db_connection()
         cursor = conn.cursor()
+        cursor.execute("SELECT id, code_barres FROM consommables WHERE reference = ?", (self.selected_reference,))
+        row = cursor.fetchone()
+        if not row:
+            conn.close()
+            return
+        consumable_id, current_barcode = row
 
-        # Mettre à jour le consommable existant
-        cursor.execute("""
-            UPDATE consommables
-            SET type = ?, reference = ?
-            WHERE reference = ?
-        """, (consumable_type, new_reference, self.selected_reference))
-        conn.commit()
-        conn.close()
+        # Tout vérifier avant d'écrire : rien n'est modifié si une vérification échoue
+        cursor.execute("SELECT reference FROM consommables WHERE reference_cle = ? AND id <> ?",
+                       (normalize_key(new_reference), consumable_id))
+        duplicate = cursor.fetchone()
+        if duplicate:
+            conn.close()
+            QMessageBox.warning(self, "!!", f"La référence {new_reference} existe déjà ({duplicate[0]}).")
+            return
+        try:
+            if normalized_barcode != current_barcode and normalized_barcode is not None:
+                check_barcode_free(cursor, normalized_barcode, "consommables", consumable_id)
+        except ValueError as e:
+            conn.close()
+            QMessageBox.warning(self, "!!", str(e))
+            return
+
+        # Mettre à jour le consommable existant en une seule transaction
+        try:
+            cursor.execute("""
+                UPDATE consommables
+                SET type = ?, reference = ?, reference_cle = ?, rendement = ?, prix = ?, origine = ?
+                WHERE id = ?
+            """, (consumable_type, new_reference, normalize_key(new_reference), page_yield, price,
+                  self.origin_input.currentText() or None, consumable_id))
+            if normalized_barcode != current_barcode:
+                cursor.execute("UPDATE consommables SET code_barres = ? WHERE id = ?",
+                               (normalized_barcode, consumable_id))
+            conn.commit()
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            QMessageBox.warning(self, "!!", f"La référence {new_reference} ou le code-barres est déjà utilisé.")
+            return
+        finally:
+            conn.close()
 
-        self.parent.reset_search()
+        self.parent.check_catalog()
         self.close()  # Fermer la fenêtre après la mise à jour
 
+class LotWindow(QDialog):
+    """Recherche par lot : coller une liste de modèles et obtenir tous les consommables."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.result = None
+        self.setWindowTitle("Recherche par lot")
+        self.resize(800, 500)
+
+        input_style = """
+            font-size: 16px;
+            padding: 5px;
+            border: 1px solid #ccc;
+            border-radius: 5px;
+        """
+
+        # **Colonne 1 : Liste collée**
+        input_layout = QVBoxLayout()
+        self.brand_dropdown = QComboBox(self)
+        self.brand_dropdown.setStyleSheet(input_style)
+        self.load_marques()
+
+        self.models_input = QPlainTextEdit(self)
+        self.models_input.setPlaceholderText("Un modèle par ligne")
+        self.models_input.setStyleSheet(input_style)
+
+        search_button = QPushButton("Rechercher", self)
+        search_button.setStyleSheet("padding: 10px;")
+        search_button.clicked.connect(self.search)
+        search_button.setCursor(Qt.PointingHandCursor)
+
+        input_layout.addWidget(QLabel("Marque :", self))
+        input_layout.addWidget(self.brand_dropdown)
+        input_layout.addWidget(QLabel("Modèles :", self))
+        input_layout.addWidget(self.models_input)
+        input_layout.addWidget(search_button)
+
+        # **Colonne 2 : Consommables et modèles inconnus**
+        result_layout = QVBoxLayout()
+        self.summary_label = QLabel(self)
+        self.consumables_list = QListWidget(self)
+        self.consumables_list.setStyleSheet(input_style)
+        self.unknown_list = QListWidget(self)
+        self.unknown_list.setStyleSheet(input_style + "color: #c00;")
+        self.ambiguous_list = QListWidget(self)
+        self.ambiguous_list.setStyleSheet(input_style + "color: #c60;")
+
+        export_button = QPushButton("Exporter CSV", self)
+        export_button.setStyleSheet("padding: 10px;")
+        export_button.clicked.connect(self.export)
+        export_button.setCursor(Qt.PointingHandCursor)
+
+        result_layout.addWidget(self.summary_label)
+        result_layout.addWidget(QLabel("Consommables :", self))
+        result_layout.addWidget(self.consumables_list)
+        result_layout.addWidget(QLabel("Modèles inconnus :", self))
+        result_layout.addWidget(self.unknown_list)
+        result_layout.addWidget(QLabel("Modèles présents dans plusieurs marques (choisir la marque) :", self))
+        result_layout.addWidget(self.ambiguous_list)
+        result_layout.addWidget(export_button)
+
+        main_layout = QHBoxLayout()
+        main_layout.addLayout(input_layout)
+        main_layout.addLayout(result_layout)
+        main_layout.setSpacing(10)
+        self.setLayout(main_layout)
+
+    def load_marques(self):
+        """Load existing brands into the dropdown"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT nom FROM marques ORDER BY nom")
+        marques = cursor.fetchall()
+        conn.close()
+
+        self.brand_dropdown.clear()
+        self.brand_dropdown.addItem("Toutes les marques", None)
+        for marque in marques:
+            self.brand_dropdown.addItem(marque[0], marque[0])
+
+    def search(self):
+        """Résoudre toute la liste en une seule fois."""
+        names = self.models_input.toPlainText().splitlines()
+        if not any(name.strip() for name in names):
+            QMessageBox.warning(self, "!!", "Veuillez coller au moins un modèle.")
+            return
+
+        conn = get_db_connection()
+        self.result = resolve_models(conn, names, self.brand_dropdown.currentData())
+        conn.close()
+
+        self.consumables_list.clear()
+        for reference, ctype, quantity in self.result["consommables"]:
+            self.consumables_list.addItem(f"{quantity} x {reference} ({ctype})")
+
+        self.unknown_list.clear()
+        self.unknown_list.addItems(self.result["inconnus"])
+        self.ambiguous_list.clear()
+        self.ambiguous_list.addItems(self.result["ambigus"])
+
+        self.summary_label.setText(
+            f"{self.result['modeles']} modèle(s) reconnu(s), "
+            f"{len(self.result['inconnus'])} inconnu(s), "
+            f"{len(self.result['ambigus'])} ambigu(s), "
+            f"{len(self.result['consommables'])} référence(s)"
+        )
+
+    def export(self):
+        """Exporter le dernier résultat au format CSV."""
+        if not self.result:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Exporter", "commande.csv", "CSV (*.csv)")
+        if path:
+            export_csv(self.result, path)
+
 # Main Application
 class PrinterApp(QMainWindow):
     def __init__(self):
         super().__init__()
+        conn = get_db_connection()
+        create_schema(conn)  # Mettre à niveau une base créée par une version précédente
+        conn.close()
+
+        self.history = LookupHistory()
+        self.warm_cache = WarmCache()
+        self.load_warm_cache()
+
+        # Catalogues de fournisseurs attachés (voir federation.py), interrogés avec printers.db
+        self.federation = Federation(get_db_path())
+
+        # Suggestions différées pendant une rafale de lecteur de codes-barres
+        self.last_key_time = 0.0
+        self.scan_timer = QTimer(self)
+        self.scan_timer.setSingleShot(True)
+        self.scan_timer.setInterval(2 * SCAN_KEY_INTERVAL_MS)
+        self.scan_timer.timeout.connect(self.update_suggestions)
+
         self.initUI()
 
+        # Détection des modifications (ce poste ou un autre) par PRAGMA data_version
+        self.change_detector = ChangeDetector(get_db_path())
+        self.change_timer = QTimer(self)
+        self.change_timer.setInterval(CHANGE_POLL_MS)
+        self.change_timer.timeout.connect(self.check_catalog)
+        self.change_timer.start()
+
+        # Maintenance légère après une période sans saisie
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(IDLE_MAINTENANCE_MS)
+        self.idle_timer.timeout.connect(self.run_idle_maintenance)
+        self.model_input.textChanged.connect(lambda _: self.idle_timer.start())
+        self.idle_timer.start()
+
     def initUI(self):
         self.setWindowTitle("Consultation Cartouches")
         self.resize(800, 500)
@@ -620,6 +958,7 @@ class PrinterApp(QMainWindow):
         self.model_input.setPlaceholderText("Entrez le modèle ici...")
         enforce_uppercase(self.model_input)
         self.model_input.textChanged.connect(self.suggest_models)
+        self.model_input.returnPressed.connect(self.handle_scan)
         self.model_input.setStyleSheet("""
             font-size: 16px;
             padding: 8px;
@@ -722,32 +1061,61 @@ class PrinterApp(QMainWindow):
         new_model_action = QAction("Nouveau Modèle d'imprimante", self)
         modify_ink_action = QAction("Modifier encre d'imprimante", self)
         details_modify_ink_action = QAction("Détails/modifier encre", self)
+        batch_action = QAction("Recherche par lot", self)
 
         # Connect actions to their functions
         new_model_action.triggered.connect(self.open_ajouter_window)
         modify_ink_action.triggered.connect(self.open_modifier_window)
         details_modify_ink_action.triggered.connect(self.open_modifier_consumable_window)
+        batch_action.triggered.connect(self.open_lot_window)
 
         # Add actions to the menu
         options_menu.addAction(new_model_action)
         options_menu.addAction(modify_ink_action)
         options_menu.addAction(details_modify_ink_action)
+        options_menu.addAction(batch_action)
 
            
+    # Preload the most looked-up models and their consumables
+    def load_warm_cache(self):
+        conn = get_db_connection()
+        self.history.flush(conn)
+        self.warm_cache.load(conn)
+        conn.close()
+
     # Load brands into the dropdown
     def load_brands(self):
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT id, nom FROM marques")
         brands = cursor.fetchall()
+        selected_brand = self.brand_dropdown.currentData()
         self.brand_dropdown.clear()
         self.brand_dropdown.addItem("Sélectionnez une marque", -1)
         for brand in brands:
             self.brand_dropdown.addItem(brand[1], brand[0])
+        # Marques connues seulement des fournisseurs : repérées par leur nom
+        for brand_name in self.federation.brands():
+            self.brand_dropdown.addItem(brand_name, brand_name)
+        # Conserver la marque sélectionnée si elle existe toujours
+        self.brand_dropdown.setCurrentIndex(max(self.brand_dropdown.findData(selected_brand), 0))
         conn.close()
 
     # Suggest models dynamically based on input
     def suggest_models(self):
+        # Un lecteur de codes-barres tape plus vite qu'un humain : pas d'autocomplétion
+        # pendant la rafale, les suggestions attendent la fin de la saisie. Une saisie
+        # de chiffres seuls peut être le début d'un code : différée dès la première
+        # touche, pour que handle_scan reçoive le code avant toute requête de suggestions
+        now = time.perf_counter()
+        in_burst = (now - self.last_key_time) * 1000 < SCAN_KEY_INTERVAL_MS
+        self.last_key_time = now
+        if in_burst or self.model_input.text().strip().isdigit():
+            self.scan_timer.start()
+            return
+        self.update_suggestions()
+
+    def update_suggestions(self):
         brand_id = self.brand_dropdown.currentData()
         model_name = self.model_input.text().strip()
 
@@ -756,22 +1124,50 @@ class PrinterApp(QMainWindow):
             self.result_label.hide()
             return
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT nom FROM modeles
-            WHERE id_marque = ? AND nom LIKE ?
-            LIMIT 10
-        """, (brand_id, f"%{model_name}%"))
-        models = cursor.fetchall()
-        conn.close()
+        model_key = normalize_key(model_name)
+        if not model_key:
+            self.suggestions_list.clear()
+            return
+
+        sources = {}
+        if self.federation.active:
+            # Tous les catalogues en une requête ; le cache ne couvre que printers.db
+            suggestions = self.federation.suggest(self.brand_dropdown.currentText(), model_name)
+            models = [model for model, _ in suggestions]
+            sources = dict(suggestions)
+        else:
+            # Les modèles populaires préchargés suffisent souvent à remplir la liste
+            models = self.warm_cache.suggest(brand_id, model_name)
+        if models is None:
+            # Même classement que Federation.suggest : début du nom, popularité, nom.
+            # Les clés ne contiennent que [0-9A-Z] : model_key + "[" borne l'intervalle
+            # des noms commençant par model_key, parcouru sur l'index (id_marque, nom_cle)
+            conn = get_db_connection()
+            models = self.query_suggestions(conn, brand_id, "m.nom_cle >= ? AND m.nom_cle < ?",
+                                            (model_key, model_key + "["), model_key)
+            if len(models) < 10:
+                # Pas assez de débuts de nom : recherche dans tout le nom (parcours de la marque)
+                models = self.query_suggestions(conn, brand_id, "m.nom_cle LIKE ?", (f"%{model_key}%",), model_key)
+            conn.close()
 
         self.suggestions_list.clear()
         if models:
             for model in models:
-                self.suggestions_list.addItem(model[0])
+                self.suggestions_list.addItem(model)
+                if model in sources:
+                    self.suggestions_list.item(self.suggestions_list.count() - 1).setToolTip(", ".join(sources[model]))
             self.suggestions_list.show()
 
+    def query_suggestions(self, conn, brand_id, condition, condition_params, model_key):
+        cursor = conn.execute(f"""
+            SELECT m.nom FROM modeles m
+            LEFT JOIN historique_recherches h ON h.id_modele = m.id
+            WHERE m.id_marque = ? AND {condition}
+            ORDER BY m.nom_cle LIKE ? DESC, COALESCE(h.compteur, 0) DESC, m.nom
+            LIMIT 10
+        """, (brand_id, *condition_params, f"{model_key}%"))
+        return [row[0] for row in cursor.fetchall()]
+
     # Select a suggestion and display its consumables
     def select_suggestion(self, item):
         selected_model = item.text()
@@ -780,42 +1176,102 @@ class PrinterApp(QMainWindow):
         self.search_consumables()
 
     # Search consumables based on brand and model
-    def search_consumables(self):
+    def search_consumables(self, record=True):
         brand_id = self.brand_dropdown.currentData()
         model_name = self.model_input.text().strip()
 
         if not brand_id or not model_name:
-            self.result_table.setRowCount(0)
+            self.result_label.hide()
             return
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT c.type, c.reference
-            FROM modeles m
-            JOIN modeles_consommables mc ON m.id = mc.id_modele
-            JOIN consommables c ON mc.id_consommable = c.id
-            WHERE m.id_marque = ? AND m.nom = ?
-        """, (brand_id, model_name))
-        results = cursor.fetchall()
-        conn.close()
+        cached = self.warm_cache.get_consumables(brand_id, model_name)
+        if self.federation.active:
+            # Résultats fusionnés de tous les catalogues, avec leur provenance
+            found = self.federation.consumables(self.brand_dropdown.currentText(), model_name)
+            results = [
+                (ctype, f"{cref} <small>[{', '.join(sources)}]</small>", substitutes)
+                for ctype, cref, substitutes, sources in found
+            ]
+            row = self.federation.conn.execute(
+                "SELECT id FROM modeles WHERE id_marque = ? AND nom_cle = ?", (brand_id, normalize_key(model_name))
+            ).fetchone()
+            model_id = row[0] if row else None
+        elif cached is not None:
+            results = [(ctype, cref, substitutes) for _, ctype, cref, substitutes in cached]
+            model_id = self.warm_cache.get_model_id(brand_id, model_name)
+        else:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT m.id, c.type, c.reference, {SUBSTITUTES_SQL}
+                FROM modeles m
+                JOIN modeles_consommables mc ON m.id = mc.id_modele
+                JOIN consommables c ON mc.id_consommable = c.id
+                WHERE m.id_marque = ? AND m.nom_cle = ?
+            """, (brand_id, normalize_key(model_name)))
+            rows = cursor.fetchall()
+            conn.close()
+            results = [(ctype, cref, substitutes) for _, ctype, cref, substitutes in rows]
+            model_id = rows[0][0] if rows else None
+
+        if results and record and model_id is not None:
+            self.record_lookup(model_id)
+        self.show_consumables(results)
 
+    # Display [(type, reference, substitutes)] in the result label
+    def show_consumables(self, results, header="", footer=""):
         if results:
             # Format the results as a string
             result_text = "<br>".join(
-                f"<b>{ctype}:</b> {cref}" for ctype, cref in results
+                f"<b>{ctype}:</b> {cref}" + (f" <i>(équivalents : {substitutes})</i>" if substitutes else "")
+                for ctype, cref, substitutes in results
             )
-            self.result_label.setText(result_text)
-            self.result_label.show()
         else:
-            self.result_label.setText("Aucun consommable trouvé pour ce modèle.")
+            result_text = "Aucun consommable trouvé pour ce modèle."
+        self.result_label.setText(header + result_text + footer)
+        self.result_label.show()
+
+    # Resolve a scanned barcode by exact lookup, bypassing the suggestions
+    def handle_scan(self):
+        code = normalize_barcode(self.model_input.text())
+        if code is None:
+            return  # Pas un code-barres : saisie d'un modèle
+        self.scan_timer.stop()
+
+        conn = get_db_connection()
+        found = lookup_barcode(conn, code)
+        conn.close()
+
+        self.suggestions_list.clear()
+        self.model_input.blockSignals(True)  # Ne pas relancer les suggestions
+        if found is None:
+            self.model_input.clear()
+            self.result_label.setText(f"Code-barres inconnu : {code}")
             self.result_label.show()
+        elif found[0] == "modele":
+            (brand_id, brand, model), consumables = found[1], found[2]
+            self.brand_dropdown.setCurrentIndex(max(self.brand_dropdown.findData(brand_id), 0))
+            self.model_input.setText(model)
+            self.show_consumables(consumables, header=f"<b>{brand} {model}</b><br>")
+        else:
+            consumable, printers = found[1], found[2]
+            printers_text = ", ".join(f"{brand} {model}" for brand, model in printers) or "aucune"
+            self.model_input.clear()
+            self.show_consumables([consumable], footer=f"<br>Imprimantes compatibles : {printers_text}")
+        self.model_input.blockSignals(False)
+
+    # Count a successful lookup; writes are batched in historique_recherches
+    def record_lookup(self, model_id):
+        if self.history.record(model_id):
+            conn = get_db_connection()
+            self.history.flush(conn)
+            conn.close()
 
     # Open a new window to add marque, model, and consumable
     def open_ajouter_window(self):
         """Open the Ajouter window"""
         ajouter_window = AjouterWindow(parent=self)
-        ajouter_window.data_added.connect(self.refresh_data)
+        ajouter_window.data_added.connect(self.check_catalog)  # Rafraîchir uniquement ce qui a changé
         ajouter_window.exec_()  # Open the window in a modal way
       
     def open_modifier_window(self):
@@ -836,8 +1292,8 @@ class PrinterApp(QMainWindow):
             FROM modeles m
             JOIN modeles_consommables mc ON m.id = mc.id_modele
             JOIN consommables c ON mc.id_consommable = c.id
-            WHERE m.id_marque = ? AND m.nom = ?
-        """, (brand_id, model_name))
+            WHERE m.id_marque = ? AND m.nom_cle = ?
+        """, (brand_id, normalize_key(model_name)))
         consumable_data = cursor.fetchone()
         conn.close()
 
@@ -846,7 +1302,7 @@ class PrinterApp(QMainWindow):
             return  # Optionally, show a message to the user
 
         # Open the modifier window with the fetched data
-        self.modifier_window = ModifierWindow(model_name, consumable_data, parent=self)
+        self.modifier_window = ModifierWindow(model_name, brand_id, consumable_data, parent=self)
         self.modifier_window.show()
   
     # Define the function to open the new window for modifying a consumable
@@ -854,19 +1310,67 @@ class PrinterApp(QMainWindow):
         self.modifier_consumable_window = ModifierConsumableWindow(parent=self)
         self.modifier_consumable_window.show()
 
-    def refresh_data(self):
-        self.load_brands()
-        self.suggestions_list.clear()
-        self.result_label.clear()
+    def open_lot_window(self):
+        lot_window = LotWindow(parent=self)
+        lot_window.exec_()
 
-    def reset_search(self):
+    def check_catalog(self):
         """
-        Réinitialise les champs de recherche et les résultats affichés.
+        Rafraîchit seulement les vues touchées par les tables modifiées.
+        Appelée par le minuteur et directement après chaque modification.
         """
-        self.brand_dropdown.setCurrentIndex(0)  # Réinitialiser le dropdown des marques
-        self.model_input.clear()               # Effacer le champ du modèle
-        self.suggestions_list.clear()          # Vider les suggestions
-        self.result_label.clear()       # Réinitialiser la table des résultats
+        changed = self.change_detector.poll()
+        if not changed:
+            return
+
+        if changed & {'modeles', 'consommables'}:
+            # Lignes écrites sans clé par un poste resté sur une version précédente :
+            # les compléter tout de suite, sinon les recherches par clé les ignorent
+            conn = get_db_connection()
+            try:
+                if fill_missing_keys(conn.cursor()):
+                    conn.commit()
+                    changed |= self.change_detector.poll()  # Absorber notre propre écriture
+            except sqlite3.OperationalError:
+                pass  # Base occupée : nouvel essai à la prochaine modification
+            finally:
+                conn.close()
+
+        if 'marques' in changed:
+            self.load_brands()
+
+        if changed & {'modeles', 'consommables', 'modeles_consommables', 'groupes_equivalence'}:
+            self.load_warm_cache()
+            if self.suggestions_list.count():
+                self.update_suggestions()
+            # Relancer seulement une recherche par modèle : après un scan de cartouche
+            # ou un code inconnu, le champ modèle est vide et le résultat est conservé
+            brand_id = self.brand_dropdown.currentData()
+            if self.result_label.isVisible() and brand_id not in (None, -1) and self.model_input.text().strip():
+                self.search_consumables(record=False)
+
+        window = getattr(self, 'modifier_consumable_window', None)
+        if window is not None and window.isVisible() and changed & {'consommables', 'groupes_equivalence'}:
+            window.load_all_consumables()
+            window.search_consumable()
+            window.load_equivalents()
+
+    # Run the light maintenance job in a background thread (own connection)
+    def run_idle_maintenance(self):
+        conn = get_db_connection()
+        self.history.flush(conn)
+        conn.close()
+        threading.Thread(target=idle_maintenance, args=(get_db_path(),), daemon=True).start()
+
+    def closeEvent(self, event):
+        # Écrire les consultations encore en mémoire avant de quitter
+        conn = get_db_connection()
+        self.history.flush(conn)
+        conn.close()
+        self.change_timer.stop()
+        self.change_detector.close()
+        self.federation.close()
+        super().closeEvent(event)
 
        
 if __name__ == "__main__":
@@ -0,0 +1,337 @@
+"""
+Maintenance du catalogue : contrôle d'intégrité, nettoyage des orphelins,
+statistiques de l'optimiseur et compactage du fichier.
+
+Utilisation :
+    python maintenance.py [--db printers.db] [--dry-run]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from db import create_schema, get_db_path, normalize_key
+from equivalences import rebuild_groups
+
+# Requêtes représentatives dont on compare le plan avant/après maintenance
+SAMPLE_QUERIES = {
+    "suggestions": ("""
+        SELECT m.nom FROM modeles m
+        LEFT JOIN historique_recherches h ON h.id_modele = m.id
+        WHERE m.id_marque = ? AND m.nom_cle >= ? AND m.nom_cle < ?
+        ORDER BY m.nom_cle LIKE ? DESC, COALESCE(h.compteur, 0) DESC, m.nom
+        LIMIT 10
+    """, (1, "A", "A[", "A%")),
+    "consommables": ("""
+        SELECT c.type, c.reference
+        FROM modeles m
+        JOIN modeles_consommables mc ON m.id = mc.id_modele
+        JOIN consommables c ON mc.id_consommable = c.id
+        WHERE m.id_marque = ? AND m.nom_cle = ?
+    """, (1, "A")),
+    "orphelins": ("""
+        SELECT c.id FROM consommables c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM modeles_consommables mc WHERE mc.id_consommable = c.id
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM groupes_equivalence g WHERE g.id_consommable = c.id
+        )
+    """, ()),
+}
+
+def _table_exists(conn, name):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def _column_exists(conn, table, column):
+    return column in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def quick_check(conn):
+    """Retourne la liste des problèmes signalés par PRAGMA quick_check (vide si OK)."""
+    rows = [row[0] for row in conn.execute("PRAGMA quick_check")]
+    return [] if rows == ["ok"] else rows
+
+
+def find_problems(conn):
+    """
+    Recherche ensembliste des incohérences du catalogue.
+    Retourne un dictionnaire {catégorie: [lignes]}.
+    Fonctionne aussi en lecture seule sur une base d'une version précédente
+    (tables et colonnes récentes absentes).
+    """
+    cursor = conn.cursor()
+    problems = {}
+
+    # Consommables liés à aucun modèle et équivalents à aucun autre consommable
+    in_group = """
+        AND NOT EXISTS (
+            SELECT 1 FROM groupes_equivalence g WHERE g.id_consommable = c.id
+        )
+    """ if _table_exists(conn, "groupes_equivalence") else ""
+    cursor.execute(f"""
+        SELECT c.id, c.reference FROM consommables c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM modeles_consommables mc WHERE mc.id_consommable = c.id
+        )
+        {in_group}
+    """)
+    problems["consommables_orphelins"] = cursor.fetchall()
+
+    # Liens vers un modèle ou un consommable supprimé
+    cursor.execute("""
+        SELECT mc.id_modele, mc.id_consommable FROM modeles_consommables mc
+        LEFT JOIN modeles m ON m.id = mc.id_modele
+        LEFT JOIN consommables c ON c.id = mc.id_consommable
+        WHERE m.id IS NULL OR c.id IS NULL
+    """)
+    problems["liens_pendants"] = cursor.fetchall()
+
+    # Équivalences vers un consommable supprimé
+    if _table_exists(conn, "equivalences"):
+        cursor.execute("""
+            SELECT e.id_consommable_a, e.id_consommable_b FROM equivalences e
+            LEFT JOIN consommables ca ON ca.id = e.id_consommable_a
+            LEFT JOIN consommables cb ON cb.id = e.id_consommable_b
+            WHERE ca.id IS NULL OR cb.id IS NULL
+        """)
+        problems["equivalences_pendantes"] = cursor.fetchall()
+
+    # Modèles rattachés à une marque inexistante
+    cursor.execute("""
+        SELECT m.id, m.nom FROM modeles m
+        LEFT JOIN marques b ON b.id = m.id_marque
+        WHERE b.id IS NULL
+    """)
+    problems["modeles_sans_marque"] = cursor.fetchall()
+
+    # Historique de modèles supprimés (table absente des bases jamais ouvertes par l'application)
+    if _table_exists(conn, "historique_recherches"):
+        cursor.execute("""
+            SELECT h.id_modele FROM historique_recherches h
+            LEFT JOIN modeles m ON m.id = h.id_modele
+            WHERE m.id IS NULL
+        """)
+        problems["historique_pendant"] = cursor.fetchall()
+
+    # Références différentes ayant la même clé normalisée (ex: "CH435" et "CH-435")
+    if _column_exists(conn, "consommables", "reference_cle"):
+        cursor.execute("""
+            SELECT reference_cle, GROUP_CONCAT(reference, ' | ')
+            FROM consommables
+            GROUP BY reference_cle
+            HAVING COUNT(*) > 1
+        """)
+        problems["references_en_double"] = cursor.fetchall()
+    else:
+        # Clés pas encore calculées : regroupement en Python
+        by_key = {}
+        for (reference,) in cursor.execute("SELECT reference FROM consommables"):
+            by_key.setdefault(normalize_key(reference), []).append(reference)
+        problems["references_en_double"] = [
+            (key, " | ".join(references)) for key, references in by_key.items() if len(references) > 1
+        ]
+
+    return problems
+
+
+def cleanup(conn):
+    """
+    Supprime les liens et équivalences pendants, l'historique pendant et les
+    consommables orphelins.
+    Les doublons apparents sont seulement signalés : leur fusion reste manuelle.
+    Retourne le nombre de lignes supprimées par table.
+    """
+    cursor = conn.cursor()
+    deleted = {}
+
+    cursor.execute("""
+        DELETE FROM modeles_consommables
+        WHERE NOT EXISTS (SELECT 1 FROM modeles m WHERE m.id = modeles_consommables.id_modele)
+           OR NOT EXISTS (SELECT 1 FROM consommables c WHERE c.id = modeles_consommables.id_consommable)
+    """)
+    deleted["modeles_consommables"] = cursor.rowcount
+
+    cursor.execute("""
+        DELETE FROM historique_recherches
+        WHERE NOT EXISTS (SELECT 1 FROM modeles m WHERE m.id = historique_recherches.id_modele)
+    """)
+    deleted["historique_recherches"] = cursor.rowcount
+
+    cursor.execute("""
+        DELETE FROM equivalences
+        WHERE NOT EXISTS (SELECT 1 FROM consommables c WHERE c.id = equivalences.id_consommable_a)
+           OR NOT EXISTS (SELECT 1 FROM consommables c WHERE c.id = equivalences.id_consommable_b)
+    """)
+    deleted["equivalences"] = cursor.rowcount
+    if deleted["equivalences"]:
+        rebuild_groups(conn)  # Des groupes ont pu se scinder
+
+    cursor.execute("""
+        DELETE FROM consommables
+        WHERE NOT EXISTS (
+            SELECT 1 FROM modeles_consommables mc WHERE mc.id_consommable = consommables.id
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM groupes_equivalence g WHERE g.id_consommable = consommables.id
+        )
+    """)
+    deleted["consommables"] = cursor.rowcount
+
+    conn.commit()
+    return deleted
+
+
+def optimize(conn):
+    """Met à jour les statistiques de l'optimiseur."""
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+
+
+def query_plans(conn):
+    """Plan d'exécution de chaque requête représentative, sous forme de texte."""
+    plans = {}
+    for name, (sql, params) in SAMPLE_QUERIES.items():
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.OperationalError as e:
+            plans[name] = [f"indisponible ({e})"]
+            continue
+        plans[name] = [row[3] for row in rows]
+    return plans
+
+
+def compact(conn):
+    """
+    Compacte la base sur place avec VACUUM. Le fichier n'est pas remplacé : les
+    connexions ouvertes ailleurs (application, détection des modifications)
+    restent valides et aucune écriture ne peut se perdre entre copie et échange.
+    Lève sqlite3.OperationalError si une autre connexion lit ou écrit à ce moment.
+    """
+    conn.execute("VACUUM")
+
+
+def run_maintenance(db_path, dry_run=False):
+    """
+    Exécute la maintenance complète et retourne un rapport :
+    intégrité, problèmes trouvés, lignes supprimées, taille et plans avant/après.
+    Une base illisible (fichier tronqué, pas une base SQLite) est signalée dans
+    "integrite" ; seule une base occupée lève sqlite3.OperationalError.
+    """
+    report = {"taille_avant": os.path.getsize(db_path)}
+
+    if dry_run:
+        # Lecture seule : ni mise à niveau du schéma, ni nettoyage
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(db_path, timeout=1)  # Base occupée : abandonner le compactage plutôt qu'attendre
+    try:
+        report["integrite"] = quick_check(conn)
+    except sqlite3.OperationalError:
+        conn.close()
+        raise
+    except sqlite3.DatabaseError as e:
+        report["integrite"] = [str(e)]
+    if report["integrite"]:
+        # Ne rien réécrire dans une base corrompue
+        conn.close()
+        return report
+
+    if not dry_run:
+        create_schema(conn)  # Mise à niveau du schéma, comme au démarrage de l'application
+    # Plans « avant » sur le schéma à jour : la comparaison porte sur le nettoyage et ANALYZE
+    report["plans_avant"] = query_plans(conn)
+    report["problemes"] = find_problems(conn)
+
+    if not dry_run:
+        report["supprimes"] = cleanup(conn)
+        optimize(conn)
+        try:
+            compact(conn)
+        except sqlite3.OperationalError as e:
+            report["compactage"] = f"non effectué, base occupée ({e})"
+
+    report["plans_apres"] = query_plans(conn)
+    conn.close()
+    report["taille_apres"] = os.path.getsize(db_path)
+    return report
+
+
+def idle_maintenance(db_path):
+    """
+    Maintenance légère lancée par l'application pendant l'inactivité :
+    pas de compactage, le fichier peut être ouvert ailleurs.
+    """
+    conn = sqlite3.connect(db_path, timeout=1)
+    try:
+        if not quick_check(conn):
+            cleanup(conn)
+            conn.execute("PRAGMA optimize")
+    except sqlite3.DatabaseError:
+        # Base occupée (nouvel essai à la prochaine inactivité) ou endommagée
+        # (signalée par `python maintenance.py`) : rien à faire en arrière-plan
+        pass
+    finally:
+        conn.close()
+
+
+def print_report(report):
+    if report["integrite"]:
+        print("Intégrité : ÉCHEC")
+        for line in report["integrite"]:
+            print(f"  {line}")
+        return
+    print("Intégrité : ok")
+
+    print("\nProblèmes trouvés :")
+    for category, rows in report["problemes"].items():
+        print(f"  {category} : {len(rows)}")
+        for row in rows[:10]:
+            print(f"    {row}")
+
+    if "supprimes" in report:
+        print("\nLignes supprimées :")
+        for table, count in report["supprimes"].items():
+            print(f"  {table} : {count}")
+
+    print("\nPlans d'exécution :")
+    for name in report["plans_avant"]:
+        before = report["plans_avant"][name]
+        after = report["plans_apres"][name]
+        print(f"  {name} :")
+        for line in before:
+            print(f"    avant : {line}")
+        if after != before:
+            for line in after:
+                print(f"    après : {line}")
+        else:
+            print("    après : inchangé")
+
+    if "compactage" in report:
+        print(f"\nCompactage : {report['compactage']}")
+
+    before, after = report["taille_avant"], report["taille_apres"]
+    print(f"\nTaille : {before / 1024:.1f} Ko -> {after / 1024:.1f} Ko")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintenance du catalogue d'imprimantes")
+    parser.add_argument("--db", default=None, help="Chemin de la base (défaut : printers.db)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Analyser sans modifier la base")
+    args = parser.parse_args()
+
+    db_path = args.db or get_db_path()
+    if not os.path.isfile(db_path):
+        sys.exit(f"Base introuvable : {db_path}")
+    try:
+        report = run_maintenance(db_path, dry_run=args.dry_run)
+    except sqlite3.OperationalError as e:
+        sys.exit(f"Base occupée, réessayer quand l'application est fermée ({e})")
+    print_report(report)
+    sys.exit(1 if report["integrite"] else 0)